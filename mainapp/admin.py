@@ -9,7 +9,7 @@ from django.contrib import admin
 # Import our models
 # These are the models we defined in models.py
 # We need to import them to register them
-from .models import BlogPost, Comment, Category
+from .models import BlogPost, Comment, Category, ArchivedBlogPost, Task
 
 # This is a comment
 # Another comment
@@ -195,6 +195,61 @@ class CategoryAdmin(admin.ModelAdmin):
     ordering = ['name']
 
 
+# Archived post admin configuration
+# Read-only view of the archive
+# Posts get here through the archive_old_posts command
+@admin.register(ArchivedBlogPost)
+class ArchivedBlogPostAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for ArchivedBlogPost model
+    """
+
+    # List display
+    list_display = [
+        'title',  # Post title
+        'author',  # Author name
+        'created_at',  # Original creation date
+        'archived_at',  # When it was archived
+    ]
+
+    # Search fields
+    search_fields = ['title', 'author']
+
+    # Date hierarchy
+    date_hierarchy = 'created_at'
+
+    # NECESSARY: Archived rows are copies, so nothing is editable
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# Task admin configuration
+# For checking on the background queue and failed tasks
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for Task model
+    """
+
+    # List display
+    list_display = ['name', 'status', 'attempts', 'run_at', 'finished_at']
+
+    # Filter by type and state
+    list_filter = ['status', 'name']
+
+    # Newest first
+    ordering = ['-created_at']
+
+    # Tasks are written by the queue, not by hand
+    readonly_fields = [
+        'name', 'payload', 'attempts', 'max_attempts', 'claimed_by',
+        'created_at', 'started_at', 'finished_at', 'last_error',
+    ]
+
+
 # Alternative registration method
 # You can also register without decorator
 # Like this:
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class MainappConfig(AppConfig):
     name = 'mainapp'
+
+    def ready(self):
+        # Register the background tasks in every process, not just the worker
+        # NECESSARY: enqueue() reads max_attempts from the registry,
+        # and eager mode runs tasks inside the web process
+        from . import tasks  # noqa: F401
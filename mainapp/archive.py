@@ -0,0 +1,209 @@
+# Archive helpers
+# This file moves old posts and their comments into archive tables
+# Keeping the BlogPost and Comment tables small keeps them fast
+
+# Importing what we need
+# NECESSARY: transaction makes each batch all-or-nothing
+import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+
+# Our models
+# The live tables and their archive copies
+from .models import ArchivedBlogPost, ArchivedComment, BlogPost, Comment
+
+
+# Default batch size
+# How many posts are moved per transaction
+# Small enough to keep locks short, big enough to be fast
+DEFAULT_BATCH_SIZE = 500
+
+
+def months_ago(months, now=None):
+    """
+    Return the datetime that is `months` calendar months before `now`
+    The day is clamped, so March 31 minus one month is February 28/29
+    """
+    # Default to the current time
+    now = now or timezone.now()
+
+    # Work out the target year and month
+    # Months are counted from zero to make the maths easier
+    total = now.year * 12 + (now.month - 1) - months
+    year, month = divmod(total, 12)
+    month += 1
+
+    # Clamp the day to the length of the target month
+    # The first day of the next month minus one day is the last day
+    next_month = now.replace(
+        year=year + month // 12, month=month % 12 + 1, day=1
+    )
+    last_day = (next_month - datetime.timedelta(days=1)).day
+    return now.replace(year=year, month=month, day=min(now.day, last_day))
+
+
+def archive_old_posts(months=12, batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Move posts created more than `months` months ago into the archive
+    Their comments are moved with them
+    Returns a (posts, comments) tuple with the number of rows moved
+    """
+    # Everything created before this point gets archived
+    cutoff = months_ago(months, now)
+
+    # Running totals for the report
+    moved_posts = 0
+    moved_comments = 0
+
+    # Move one batch at a time until nothing is left
+    # Each batch is its own transaction
+    while True:
+        with transaction.atomic():
+            # Oldest posts first
+            # Ordering by pk keeps batches stable
+            # NECESSARY: select_for_update locks the batch until the commit,
+            # so an edit or a new comment can't slip in between copy and delete
+            # (on PostgreSQL the lock also blocks inserting comments for these posts)
+            posts = list(
+                BlogPost.objects
+                .select_for_update()
+                .filter(created_at__lt=cutoff)
+                .order_by('pk')[:batch_size]
+            )
+            if not posts:
+                break
+            post_ids = [post.pk for post in posts]
+
+            # Copy the posts into the archive
+            # NECESSARY: bulk_create inserts the whole batch in one query
+            ArchivedBlogPost.objects.bulk_create([
+                ArchivedBlogPost(
+                    id=post.pk,
+                    title=post.title,
+                    content=post.content,
+                    author=post.author,
+                    created_at=post.created_at,
+                    updated_at=post.updated_at,
+                    is_published=post.is_published,
+                    view_count=post.view_count,
+                )
+                for post in posts
+            ])
+
+            # Copy the comments
+            # values_list avoids building a Comment instance per row
+            # Locked as well, so comment edits aren't lost either
+            comments = Comment.objects.select_for_update().filter(post_id__in=post_ids).values_list(
+                'id', 'post_id', 'name', 'email', 'text', 'created_at', 'is_approved'
+            )
+            # NECESSARY: Inserted batch_size rows at a time while reading,
+            # so heavily commented posts never hold every comment in memory
+            rows = comments.iterator(chunk_size=batch_size)
+            while True:
+                archived = [
+                    ArchivedComment(
+                        id=pk,
+                        post_id=post_id,
+                        name=name,
+                        email=email,
+                        text=text,
+                        created_at=created_at,
+                        is_approved=is_approved,
+                    )
+                    for pk, post_id, name, email, text, created_at, is_approved
+                    in islice(rows, batch_size)
+                ]
+                if not archived:
+                    break
+                ArchivedComment.objects.bulk_create(archived)
+                moved_comments += len(archived)
+
+            # Delete the comments first
+            # NECESSARY: Comment has no dependents or signals,
+            # so this is a single DELETE instead of a cascade done in Python
+            Comment.objects.filter(post_id__in=post_ids).delete()
+
+            # Then the posts
+            # This still cascades to their RelatedPost rows, in both directions
+            BlogPost.objects.filter(pk__in=post_ids).delete()
+
+            # Update the total
+            moved_posts += len(posts)
+
+    return moved_posts, moved_comments
+
+
+def restore_post(pk):
+    """
+    Move an archived post and its comments back to the live tables
+    Returns the restored BlogPost
+    """
+    with transaction.atomic():
+        # Load the archived post
+        # Raises ArchivedBlogPost.DoesNotExist if it isn't archived
+        archived = ArchivedBlogPost.objects.get(pk=pk)
+
+        # Recreate the live post with its original id
+        post = BlogPost(
+            id=archived.pk,
+            title=archived.title,
+            content=archived.content,
+            author=archived.author,
+            is_published=archived.is_published,
+            view_count=archived.view_count,
+        )
+        BlogPost.objects.bulk_create([post])
+
+        # Recreate the comments
+        archived_comments = list(archived.comments.all())
+        comments = [
+            Comment(
+                id=comment.pk,
+                post_id=archived.pk,
+                name=comment.name,
+                email=comment.email,
+                text=comment.text,
+                is_approved=comment.is_approved,
+            )
+            for comment in archived_comments
+        ]
+        Comment.objects.bulk_create(comments)
+
+        # Put the original timestamps back
+        # NECESSARY: bulk_create applies auto_now/auto_now_add,
+        # bulk_update doesn't, so the dates are written in a second step
+        post.created_at = archived.created_at
+        post.updated_at = archived.updated_at
+        BlogPost.objects.bulk_update([post], ['created_at', 'updated_at'])
+        for comment, original in zip(comments, archived_comments):
+            comment.created_at = original.created_at
+        Comment.objects.bulk_update(comments, ['created_at'])
+
+        # Remove the archive copy
+        # Its comments go with it in one DELETE
+        archived.comments.all().delete()
+        archived.delete()
+
+    return post
+
+
+def get_post_or_404(pk):
+    """
+    Look up a post by id, falling through to the archive
+    Raises Http404 if the post is in neither table
+    """
+    # Hot table first
+    # Almost every lookup is for a recent post
+    try:
+        return BlogPost.objects.get(pk=pk)
+    except BlogPost.DoesNotExist:
+        pass
+
+    # Then the archive
+    try:
+        return ArchivedBlogPost.objects.get(pk=pk)
+    except ArchivedBlogPost.DoesNotExist:
+        raise Http404("No post with that id")
@@ -0,0 +1,102 @@
+# View counters
+# Post views are counted in memory and written to the database in batches
+# The web worker queues the batch, the background worker does the UPDATEs
+
+import atexit
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import BlogPost
+
+
+# Views not yet written to the database
+# Maps post id to the number of views
+_pending = Counter()
+
+# NECESSARY: Views come in on several threads at once
+_lock = threading.Lock()
+
+# Timer that hands the buffer over after VIEW_COUNT_FLUSH_INTERVAL seconds
+# Started by the first view in an empty buffer, so quiet periods don't keep views in memory
+_timer = None
+
+
+def record_view(pk):
+    """
+    Count one view of a post
+    Hands the buffer to the task queue when it is full,
+    or VIEW_COUNT_FLUSH_INTERVAL seconds after its first view
+    """
+    global _timer
+    with _lock:
+        _pending[pk] += 1
+        full = sum(_pending.values()) >= settings.VIEW_COUNT_FLUSH_THRESHOLD
+        if not full and _timer is None:
+            _timer = threading.Timer(settings.VIEW_COUNT_FLUSH_INTERVAL, _flush_later)
+            # NECESSARY: A daemon thread doesn't keep the worker from exiting
+            _timer.daemon = True
+            _timer.start()
+    if full:
+        queue_view_counts()
+
+
+def _flush_later():
+    """
+    Timer callback, runs in its own thread
+    """
+    try:
+        queue_view_counts()
+    finally:
+        # The timer thread opened its own database connection
+        connection.close()
+
+
+def take_pending():
+    """
+    Empty the buffer and return what was in it
+    """
+    global _timer
+    with _lock:
+        counts = dict(_pending)
+        _pending.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+    return counts
+
+
+def apply_view_counts(counts):
+    """
+    Add the buffered views to BlogPost.view_count
+    `counts` maps post id to number of views
+    """
+    # Group posts by how many views they got
+    # Posts with the same count share one UPDATE
+    by_count = defaultdict(list)
+    for pk, views in counts.items():
+        by_count[views].append(pk)
+
+    # NECESSARY: F() adds in the database, so concurrent flushes don't lose views
+    # NECESSARY: All or nothing, a retried task must not add views twice
+    with transaction.atomic():
+        for views, pks in by_count.items():
+            BlogPost.objects.filter(pk__in=pks).update(view_count=F('view_count') + views)
+
+
+def queue_view_counts():
+    """
+    Hand the buffered views to the background worker
+    One INSERT here, the UPDATEs happen in the worker
+    """
+    from .taskqueue import enqueue
+    counts = take_pending()
+    if counts:
+        enqueue('apply_view_counts', counts=counts)
+
+
+# Don't lose the buffer when the worker is recycled or redeployed
+atexit.register(queue_view_counts)
@@ -0,0 +1,301 @@
+# Sitemap and feed builder
+# This file writes sitemap.xml and the RSS/Atom feeds to disk
+# The views just send these files, so crawlers never cause a query
+
+# Standard library imports
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+# Django imports
+# NECESSARY: feedgenerator writes valid RSS and Atom for us
+from django.conf import settings
+from django.db.models import Count, F, Max
+from django.urls import reverse
+from django.utils import feedgenerator
+
+# Our models
+from .models import BlogPost
+
+
+# Sitemap shard size
+# NECESSARY: The sitemap protocol allows at most 50,000 URLs per file
+SITEMAP_SHARD_SIZE = 50000
+
+# Number of posts in the RSS/Atom feeds
+FEED_ITEMS = 20
+
+# Manifest file name
+# Remembers what every file was built from
+MANIFEST_NAME = 'manifest.json'
+
+# Lock file held while a build runs
+# Only one build at a time, across threads, processes and cron
+LOCK_NAME = 'build.lock'
+
+# A lock older than this was left by a build that crashed
+STALE_LOCK_SECONDS = 600
+
+
+def feeds_root():
+    """
+    Directory the generated files live in
+    """
+    return settings.FEEDS_ROOT
+
+
+def shard_name(shard):
+    """
+    File name of one sitemap shard
+    """
+    return f'sitemap-{shard}.xml'
+
+
+def _absolute(path):
+    """
+    Turn a site path into a full URL
+    Sitemaps and feeds need absolute URLs
+    """
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def _load_manifest():
+    """
+    Read the manifest, or return an empty one
+    """
+    try:
+        with open(os.path.join(feeds_root(), MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_file(name, data):
+    """
+    Write a file atomically
+    Readers see either the old file or the new one, never half of one
+    """
+    path = os.path.join(feeds_root(), name)
+    # A unique temporary name, so two builds running at once don't collide
+    fd, tmp_path = tempfile.mkstemp(dir=feeds_root(), prefix=name, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    # mkstemp creates the file as 0600, make it readable like a normal file
+    os.chmod(tmp_path, 0o644)
+    # NECESSARY: os.replace is atomic on the same filesystem
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def build_lock(timeout=60):
+    """
+    Hold the build lock for the duration of the with block
+    Waits up to `timeout` seconds for another build, then raises TimeoutError
+    """
+    path = os.path.join(feeds_root(), LOCK_NAME)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            # NECESSARY: O_EXCL makes creating the file atomic, only one build gets it
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            break
+        except FileExistsError:
+            # Take over the lock of a build that died
+            try:
+                if time.time() - os.stat(path).st_mtime > STALE_LOCK_SECONDS:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() >= deadline:
+                raise TimeoutError("Another feed build is still running")
+            time.sleep(0.1)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        os.remove(path)
+
+
+def _published_posts():
+    """
+    Posts that belong in sitemaps and feeds
+    """
+    return BlogPost.objects.filter(is_published=True)
+
+
+def _render_shard(shard):
+    """
+    Build the XML for one sitemap shard
+    Only id and updated_at are loaded, the URL is built from the id
+    """
+    rows = (
+        _published_posts()
+        .filter(pk__gte=shard * SITEMAP_SHARD_SIZE, pk__lt=(shard + 1) * SITEMAP_SHARD_SIZE)
+        .order_by('pk')
+        .values_list('pk', 'updated_at')
+    )
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    # iterator() streams rows instead of caching 50k objects
+    for pk, updated_at in rows.iterator(chunk_size=2000):
+        url = escape(_absolute(BlogPost(pk=pk).get_absolute_url()))
+        parts.append(
+            f'<url><loc>{url}</loc><lastmod>{updated_at.date().isoformat()}</lastmod></url>\n'
+        )
+    parts.append('</urlset>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def _render_index(shards):
+    """
+    Build sitemap.xml, the index pointing at every shard
+    `shards` maps shard number to its manifest entry
+    """
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    for shard in sorted(shards, key=int):
+        url = escape(_absolute(reverse('sitemap_shard', args=[int(shard)])))
+        lastmod = shards[shard]['latest'][:10]  # Just the date part
+        parts.append(f'<sitemap><loc>{url}</loc><lastmod>{lastmod}</lastmod></sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def build_sitemaps(manifest, force=False):
+    """
+    Rebuild the sitemap shards whose posts changed
+    Returns the list of files written
+    """
+    # One query for the state of every shard
+    # A shard changes when a post in it is added, removed or updated,
+    # which shows up as a different count or a newer updated_at
+    stats = (
+        _published_posts()
+        .annotate(shard=F('pk') / SITEMAP_SHARD_SIZE)
+        .values('shard')
+        .annotate(count=Count('pk'), latest=Max('updated_at'))
+        .order_by('shard')
+    )
+    current = {
+        # int() because some databases return a decimal for the division
+        str(int(row['shard'])): {
+            'count': row['count'],
+            'latest': row['latest'].isoformat(),
+        }
+        for row in stats
+    }
+    previous = manifest.get('sitemaps', {})
+    written = []
+
+    # Rebuild changed shards only
+    for shard, state in current.items():
+        exists = os.path.exists(os.path.join(feeds_root(), shard_name(shard)))
+        if force or not exists or previous.get(shard) != state:
+            _write_file(shard_name(shard), _render_shard(int(shard)))
+            written.append(shard_name(shard))
+
+    # Remove shards that no longer have any posts
+    for shard in set(previous) - set(current):
+        try:
+            os.remove(os.path.join(feeds_root(), shard_name(shard)))
+        except FileNotFoundError:
+            pass
+
+    # The index only changes when a shard did
+    index_exists = os.path.exists(os.path.join(feeds_root(), 'sitemap.xml'))
+    if force or not index_exists or current != previous:
+        _write_file('sitemap.xml', _render_index(current))
+        written.append('sitemap.xml')
+
+    manifest['sitemaps'] = current
+    return written
+
+
+def build_feeds(manifest, force=False):
+    """
+    Rebuild the RSS and Atom feeds if the latest posts changed
+    Returns the list of files written
+    """
+    # The newest published posts
+    # Only FEED_ITEMS rows, so loading them all is cheap
+    posts = list(
+        _published_posts()
+        .order_by('-created_at')
+        .only('pk', 'title', 'content', 'author', 'created_at', 'updated_at')[:FEED_ITEMS]
+    )
+
+    # Fingerprint of the feed contents
+    # Same ids and same updated_at values mean the same feed
+    digest = hashlib.sha1()
+    for post in posts:
+        digest.update(f'{post.pk}:{post.updated_at.isoformat()};'.encode())
+    signature = digest.hexdigest()
+
+    # Nothing to do if neither the posts nor the files changed
+    names = ['rss.xml', 'atom.xml']
+    url_names = ['rss_feed', 'atom_feed']
+    files_exist = all(os.path.exists(os.path.join(feeds_root(), name)) for name in names)
+    if not force and files_exist and manifest.get('feeds') == signature:
+        return []
+
+    # Write both formats from the same posts
+    feed_classes = [feedgenerator.Rss201rev2Feed, feedgenerator.Atom1Feed]
+    for name, url_name, feed_class in zip(names, url_names, feed_classes):
+        feed = feed_class(
+            title=settings.FEED_TITLE,
+            link=_absolute(reverse('home')),
+            description=settings.FEED_DESCRIPTION,
+            feed_url=_absolute(reverse(url_name)),
+            language=settings.LANGUAGE_CODE,
+        )
+        for post in posts:
+            feed.add_item(
+                title=post.title,
+                link=_absolute(post.get_absolute_url()),
+                description=post.content,
+                author_name=post.author,
+                pubdate=post.created_at,
+                updateddate=post.updated_at,
+                unique_id=_absolute(post.get_absolute_url()),
+            )
+        _write_file(name, feed.writeString('utf-8').encode('utf-8'))
+
+    manifest['feeds'] = signature
+    return names
+
+
+def build_all(force=False, if_missing=False):
+    """
+    Bring every sitemap and feed file up to date
+    With `if_missing`, only build if nothing was built yet,
+    which is what the views use on the first request after a deploy
+    Returns the list of files written
+    """
+    # Make sure the output directory exists
+    os.makedirs(feeds_root(), exist_ok=True)
+
+    # Concurrent callers wait here instead of building the same files again
+    with build_lock():
+        # Built by whoever held the lock before us
+        if if_missing and os.path.exists(os.path.join(feeds_root(), MANIFEST_NAME)):
+            return []
+
+        # Build everything against the last manifest
+        manifest = _load_manifest()
+        written = build_sitemaps(manifest, force=force)
+        written += build_feeds(manifest, force=force)
+
+        # Save the new manifest last
+        # If a build fails half way, the next run redoes the missing parts
+        _write_file(MANIFEST_NAME, json.dumps(manifest, indent=2).encode('utf-8'))
+    return written
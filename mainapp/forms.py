@@ -0,0 +1,43 @@
+# Forms file
+# Forms validate user input before it is saved
+
+from django import forms
+
+from .models import Comment
+from .spam import check_comment, remember_comment
+
+
+# Comment form
+# Used by the add_comment view
+class CommentForm(forms.ModelForm):
+    """
+    Form for a new comment
+    Runs the spam pre-filter before anything is saved
+    """
+
+    class Meta:
+        model = Comment
+        fields = ['name', 'email', 'text']
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        # Only check complete comments
+        # Missing fields already have their own errors
+        email = cleaned_data.get('email')
+        text = cleaned_data.get('text')
+        if email and text:
+            # NECESSARY: Spam is rejected here, before it reaches the database
+            reason = check_comment(email, text)
+            if reason:
+                raise forms.ValidationError(reason, code='spam')
+        return cleaned_data
+
+    def save(self, commit=True):
+        comment = super().save(commit=commit)
+        # Later copies of this text count as duplicates
+        # NECESSARY: Only once the row has its id, so refreshes don't add it again
+        # With commit=False, call remember_comment() after saving
+        if commit:
+            remember_comment(comment.text, comment.pk)
+        return comment
@@ -0,0 +1,235 @@
+# Load testing
+# Replays a mix of page requests against a running server
+# and measures throughput, latency percentiles and errors
+# Used by `python manage.py loadtest`
+
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+# The default traffic mix
+# Maps endpoint name to (path, weight)
+# {post} is replaced by a random published post id
+DEFAULT_MIX = {
+    'home': ('/', 40),
+    'about': ('/about/', 10),
+    'contact': ('/contact/', 10),
+    'api': ('/api/data/', 20),
+    'post': ('/posts/{post}/', 15),
+    'admin': ('/admin/login/', 5),
+}
+
+
+def parse_mix(spec, mix_file=None):
+    """
+    Build the traffic mix
+    `mix_file` is a JSON file like {"home": {"path": "/", "weight": 40}}
+    `spec` overrides weights, e.g. "home=50,api=30,admin=0"
+    Returns a dict of name to (path, weight), without zero weights
+    """
+    mix = dict(DEFAULT_MIX)
+    if mix_file:
+        with open(mix_file) as f:
+            mix = {name: (entry['path'], entry.get('weight', 1)) for name, entry in json.load(f).items()}
+
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, weight = item.partition('=')
+        if name not in mix:
+            raise ValueError(f"Unknown endpoint {name!r}, choose from {', '.join(mix)}")
+        mix[name] = (mix[name][0], float(weight))
+
+    mix = {name: entry for name, entry in mix.items() if entry[1] > 0}
+    if not mix:
+        raise ValueError("The traffic mix is empty")
+    return mix
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class HTTPConnection:
+    """
+    Minimal HTTP/1.1 client on asyncio streams
+    With `keep_alive` the connection stays open between requests like a browser,
+    otherwise every request gets a new one like behind a reverse proxy
+    NECESSARY: The standard library has no async HTTP client
+    """
+
+    def __init__(self, host, port, headers, keep_alive=False):
+        self.host = host
+        self.port = port
+        self.headers = headers if keep_alive else headers + 'Connection: close\r\n'
+        self.keep_alive = keep_alive
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """
+        Send one GET and read the whole response
+        Returns (status code, body size)
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        request = f'GET {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n{self.headers}\r\n'
+        self.writer.write(request.encode('latin-1'))
+        await self.writer.drain()
+
+        # Status line and headers
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        version, status = status_line.split()[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # Body: fixed length, chunked, or until the server closes
+        if 'content-length' in headers:
+            size = int(headers['content-length'])
+            await self.reader.readexactly(size)
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                chunk_size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(chunk_size + 2)  # Data plus CRLF
+                size += chunk_size
+                if chunk_size == 0:
+                    break
+        else:
+            size = len(await self.reader.read())
+            headers['connection'] = 'close'
+
+        # runserver closes after `Connection: close` without saying so
+        # NECESSARY: HTTP/1.0 servers like `python -m http.server` close unless they say keep-alive
+        connection = headers.get('connection', '').lower()
+        persistent = connection == 'keep-alive' if version == b'HTTP/1.0' else connection != 'close'
+        if not self.keep_alive or not persistent:
+            await self.close()
+        return status, size
+
+
+class StageStats:
+    """
+    Latencies and errors of one concurrency stage, per endpoint
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.elapsed = 0.0
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, status):
+        """
+        `status` is the HTTP status code, or the exception class name
+        """
+        self.latencies[name].append(seconds)
+        self.statuses[name][status] += 1
+        # Exceptions and 4xx/5xx responses count as errors
+        if not isinstance(status, int) or status >= 400:
+            self.errors[name] += 1
+
+    def summary(self, name=None):
+        """
+        Requests, requests/sec, p50/p90/p99/max in ms and error rate
+        for one endpoint, or the whole stage when `name` is None
+        """
+        if name is None:
+            values = sorted(v for latencies in self.latencies.values() for v in latencies)
+            errors = sum(self.errors.values())
+        else:
+            values = sorted(self.latencies[name])
+            errors = self.errors[name]
+        count = len(values)
+        return {
+            'concurrency': self.concurrency,
+            'requests': count,
+            'rps': count / self.elapsed if self.elapsed else 0.0,
+            'p50': percentile(values, 50) * 1000,
+            'p90': percentile(values, 90) * 1000,
+            'p99': percentile(values, 99) * 1000,
+            'max': (values[-1] if values else 0.0) * 1000,
+            'error_rate': errors / count if count else 0.0,
+        }
+
+
+async def _user(base, mix, post_ids, stats, deadline, rng, headers, timeout, keep_alive):
+    """
+    One simulated visitor: request random endpoints until the deadline
+    """
+    names = list(mix)
+    weights = [mix[name][1] for name in names]
+    connection = HTTPConnection(base.hostname, base.port or 80, headers, keep_alive)
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            path = mix[name][0]
+            if '{post}' in path:
+                path = path.format(post=rng.choice(post_ids))
+
+            started = time.perf_counter()
+            try:
+                status, _ = await asyncio.wait_for(connection.get(path), timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, asyncio.IncompleteReadError) as exc:
+                status = type(exc).__name__
+                # The connection is in an unknown state, start a new one
+                await connection.close()
+            stats.record(name, time.perf_counter() - started, status)
+    finally:
+        await connection.close()
+
+
+async def run_stage(base_url, mix, concurrency, duration, post_ids=(), timeout=10.0,
+                    compressed=True, keep_alive=False, seed=None):
+    """
+    Run `concurrency` simulated visitors for `duration` seconds
+    Returns a StageStats
+    """
+    base = urlsplit(base_url)
+    if base.scheme != 'http':
+        raise ValueError("Only http:// URLs are supported")
+    if any('{post}' in path for path, _ in mix.values()) and not post_ids:
+        raise ValueError("The mix has post pages but there are no post ids")
+
+    # Same headers as a browser that accepts compressed pages
+    headers = 'User-Agent: loadtest\r\nAccept: */*\r\n'
+    if compressed:
+        headers += 'Accept-Encoding: br, gzip\r\n'
+
+    stats = StageStats(concurrency)
+    rng = random.Random(seed)
+    started = time.monotonic()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _user(base, mix, list(post_ids), stats, deadline, random.Random(rng.random()), headers, timeout, keep_alive)
+        for _ in range(concurrency)
+    ))
+    stats.elapsed = time.monotonic() - started
+    return stats
@@ -0,0 +1,40 @@
+# Management command to archive old posts
+# Run it from cron, e.g. once a night
+# python manage.py archive_old_posts --months 12
+
+from django.core.management.base import BaseCommand
+
+from mainapp.archive import DEFAULT_BATCH_SIZE, archive_old_posts
+
+
+class Command(BaseCommand):
+    """
+    Move old posts and their comments into the archive tables
+    """
+
+    help = "Move posts older than N months, and their comments, into the archive tables"
+
+    def add_arguments(self, parser):
+        # How old a post has to be
+        parser.add_argument(
+            '--months', type=int, default=12,
+            help="Archive posts created more than this many months ago (default: 12)",
+        )
+
+        # How many posts per transaction
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Posts moved per transaction (default: {DEFAULT_BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        # Do the work
+        posts, comments = archive_old_posts(
+            months=options['months'],
+            batch_size=options['batch_size'],
+        )
+
+        # Report what happened
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {posts} posts and {comments} comments"
+        ))
@@ -0,0 +1,129 @@
+# Management command to count database queries per anonymous request
+# Compares Django's stock session setup with our current settings
+# python manage.py bench_session_queries
+
+import argparse
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mainapp.models import BlogPost
+
+
+# Stock Django: database sessions and the normal SessionMiddleware
+STOCK = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'MIDDLEWARE': [
+        'django.contrib.sessions.middleware.SessionMiddleware'
+        if name == 'mainapp.session_middleware.PathScopedSessionMiddleware' else name
+        for name in settings.MIDDLEWARE
+    ],
+}
+
+
+class Command(BaseCommand):
+    """
+    Count queries per public request, with and without a session cookie
+    """
+
+    help = "Count database queries per anonymous request on the public pages, stock sessions vs current settings"
+
+    def add_arguments(self, parser):
+        # Extra paths to check
+        parser.add_argument(
+            '--path', action='append', default=[],
+            help="Extra path to request (repeatable)",
+        )
+
+        # Simulate a page that reads request.user, e.g. a "logged in as" header
+        # On by default: without it stock sessions are never loaded either,
+        # and both settings show 0 queries
+        parser.add_argument(
+            '--touch-user', action=argparse.BooleanOptionalAction, default=True,
+            help="Read request.user in every request, like a template showing the login state would (default: on)",
+        )
+
+    def public_paths(self):
+        """
+        The public pages, plus one post page if there is a published post
+        """
+        paths = [reverse(name) for name in ('home', 'about', 'contact', 'api_data')]
+        post = BlogPost.objects.filter(is_published=True).only('pk').first()
+        if post:
+            paths.append(post.get_absolute_url())
+        return paths
+
+    def count(self, paths, cookie, touch_user):
+        """
+        Request every path twice and count the queries of the second request
+        The second request is the steady state, after any page cache is filled
+        Returns {path: (total queries, session/auth queries)}
+        """
+        client = Client(HTTP_HOST='localhost')
+        if cookie:
+            client.cookies[settings.SESSION_COOKIE_NAME] = cookie
+
+        results = {}
+        for path in paths:
+            client.get(path)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(path)
+                if touch_user:
+                    # Force the lazy user, like {{ user }} in a template would
+                    bool(response.wsgi_request.user.is_authenticated)
+            session_queries = [
+                q for q in queries.captured_queries
+                if 'django_session' in q['sql'] or 'auth_user' in q['sql']
+            ]
+            results[path] = (len(queries), len(session_queries))
+        return results
+
+    def handle(self, *args, **options):
+        paths = self.public_paths() + options['path']
+        touch_user = options['touch_user']
+
+        # A visitor who still has a session cookie, e.g. an editor browsing the site
+        store = import_module('django.contrib.sessions.backends.db').SessionStore()
+        store['visited'] = True
+        store.create()
+        cookie = store.session_key
+
+        try:
+            table = []
+            for label, overrides in (('stock', STOCK), ('current', {})):
+                with override_settings(**overrides):
+                    for visitor, visitor_cookie in (('no cookie', None), ('cookie', cookie)):
+                        counts = self.count(paths, visitor_cookie, touch_user)
+                        for path, (total, session) in counts.items():
+                            table.append((label, visitor, path, total, session))
+        finally:
+            store.delete()
+
+        # Print the results
+        self.stdout.write(f"{'settings':<9} {'visitor':<10} {'path':<24} {'queries':>8} {'session':>8}")
+        for label, visitor, path, total, session in table:
+            self.stdout.write(f"{label:<9} {visitor:<10} {path:<24} {total:>8} {session:>8}")
+
+        # Stock vs current, per visitor
+        self.stdout.write(f"\n{'visitor':<10} {'stock':>6} {'current':>8} {'saved':>6}  (queries per request, all paths)")
+        for visitor in ('no cookie', 'cookie'):
+            totals = {
+                label: sum(row[3] for row in table if row[0] == label and row[1] == visitor)
+                for label in ('stock', 'current')
+            }
+            per_request = {label: total / len(paths) for label, total in totals.items()}
+            self.stdout.write(
+                f"{visitor:<10} {per_request['stock']:>6.2f} {per_request['current']:>8.2f} "
+                f"{per_request['stock'] - per_request['current']:>6.2f}"
+            )
+
+        # Summary line
+        current = [row for row in table if row[0] == 'current']
+        worst = max(row[3] for row in current)
+        style = self.style.SUCCESS if worst == 0 else self.style.WARNING
+        self.stdout.write(style(f"\nMost queries per anonymous request with current settings: {worst}"))
@@ -0,0 +1,32 @@
+# Management command to build sitemaps and feeds
+# Run it from cron, e.g. every few minutes
+# Only files whose posts changed are rewritten
+
+from django.core.management.base import BaseCommand
+
+from mainapp.feeds import build_all
+
+
+class Command(BaseCommand):
+    """
+    Write sitemap.xml, its shards, rss.xml and atom.xml to FEEDS_ROOT
+    """
+
+    help = "Build the sitemap and RSS/Atom feeds, rewriting only what changed"
+
+    def add_arguments(self, parser):
+        # Rebuild everything, even unchanged files
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Rewrite every file, even if nothing changed",
+        )
+
+    def handle(self, *args, **options):
+        # Do the work
+        written = build_all(force=options['force'])
+
+        # Report what happened
+        if written:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {', '.join(written)}"))
+        else:
+            self.stdout.write("Everything is up to date")
@@ -0,0 +1,51 @@
+# Management command to rebuild related posts
+# Run it from cron, e.g. once an hour
+# python manage.py build_related_posts --top-k 5
+
+from django.core.management.base import BaseCommand
+
+from mainapp.recommendations import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_FEATURES,
+    DEFAULT_TOP_K,
+    build_related_posts,
+)
+
+
+class Command(BaseCommand):
+    """
+    Recompute the RelatedPost table from TF-IDF similarity
+    """
+
+    help = "Rebuild the related posts table using TF-IDF cosine similarity"
+
+    def add_arguments(self, parser):
+        # How many related posts per post
+        parser.add_argument(
+            '--top-k', type=int, default=DEFAULT_TOP_K,
+            help=f"Related posts stored per post (default: {DEFAULT_TOP_K})",
+        )
+
+        # Vocabulary size
+        parser.add_argument(
+            '--max-features', type=int, default=DEFAULT_MAX_FEATURES,
+            help=f"Number of distinct words used (default: {DEFAULT_MAX_FEATURES}). "
+                 "Memory is posts x features x 4 bytes",
+        )
+
+        # Rows per matrix product
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f"Posts compared per matrix product (default: {DEFAULT_BATCH_SIZE})",
+        )
+
+    def handle(self, *args, **options):
+        # Do the work
+        count = build_related_posts(
+            top_k=options['top_k'],
+            max_features=options['max_features'],
+            batch_size=options['batch_size'],
+        )
+
+        # Report what happened
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} related post links"))
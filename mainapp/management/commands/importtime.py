@@ -0,0 +1,117 @@
+# Management command to measure worker startup
+# Boots Django in a fresh interpreter with `python -X importtime`
+# and reports the slowest imports, the startup time and the memory used
+
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Code run in the child interpreter
+# NECESSARY: Does what a WSGI worker does at boot, including loading the URLconf,
+# which is where the admin site gets imported
+# NECESSARY: Peak RSS comes from VmHWM in /proc/self/status where available
+# On Linux ru_maxrss keeps the parent's peak across fork and exec, so every child
+# would report at least the memory of this manage.py process
+BOOT_SCRIPT = """
+import json, resource, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+seconds = time.perf_counter() - start
+maxrss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                maxrss_kb = int(line.split()[1])
+except OSError:
+    pass
+print(json.dumps({'seconds': seconds, 'maxrss_kb': maxrss_kb}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output into (self_us, cumulative_us, module) tuples
+    """
+    rows = []
+    for line in stderr.splitlines():
+        # Lines look like: "import time:       123 |        456 |   django.db"
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # The header line
+        rows.append((int(parts[0]), int(parts[1]), parts[2].rstrip()))
+    return rows
+
+
+class Command(BaseCommand):
+    """
+    Report import time and memory for one or more settings modules
+    """
+
+    help = "Boot Django under `python -X importtime` and report startup time, RSS and the slowest imports"
+
+    def add_arguments(self, parser):
+        # Settings modules to measure
+        parser.add_argument(
+            'modules', nargs='*',
+            help="Settings modules to compare (default: the current DJANGO_SETTINGS_MODULE)",
+        )
+
+        # How many imports to list
+        parser.add_argument(
+            '--top', type=int, default=15,
+            help="Number of slowest imports to show (default: 15)",
+        )
+
+    def measure(self, module):
+        """
+        Boot Django with the given settings in a child process
+        Returns (report dict, parsed importtime rows)
+        """
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT_SCRIPT],
+            env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Booting {module} failed:\n{result.stderr[-2000:]}")
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        return report, parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or [os.environ['DJANGO_SETTINGS_MODULE']]
+        top = options['top']
+
+        summary = []
+        for module in modules:
+            report, rows = self.measure(module)
+
+            # Only top-level imports, their cumulative time includes their children
+            # The indentation in the module column shows the nesting level
+            top_level = [row for row in rows if not row[2].startswith('  ')]
+            import_us = sum(row[1] for row in top_level)
+            summary.append((module, report, len(rows), import_us))
+
+            # Slowest modules by their own time
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{module}"))
+            self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+            for self_us, cumulative_us, name in sorted(rows, reverse=True)[:top]:
+                self.stdout.write(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name.strip()}")
+
+        # Side by side totals
+        self.stdout.write(self.style.MIGRATE_HEADING("\nSummary"))
+        self.stdout.write(f"{'settings':<32} {'boot ms':>9} {'import ms':>10} {'modules':>8} {'max RSS MB':>11}")
+        for module, report, count, import_us in summary:
+            self.stdout.write(
+                f"{module:<32} {report['seconds'] * 1000:9.1f} {import_us / 1000:10.1f} "
+                f"{count:8d} {report['maxrss_kb'] / 1024:11.1f}"
+            )
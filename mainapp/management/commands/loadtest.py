@@ -0,0 +1,157 @@
+# Management command that load tests a running server
+# python manage.py runserver --noreload   (in another terminal)
+# python manage.py loadtest --ramp 1,5,10,25 --stage-duration 10
+
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp.loadtest import parse_mix, run_stage
+from mainapp.models import BlogPost
+
+
+class Command(BaseCommand):
+    """
+    Replay a traffic mix at increasing concurrency and report
+    throughput, latency percentiles and error rates
+    """
+
+    help = "Load test a running server with a configurable traffic mix"
+
+    def add_arguments(self, parser):
+        # Target
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000',
+            help="Server to test (default: http://127.0.0.1:8000)",
+        )
+
+        # Traffic mix
+        parser.add_argument(
+            '--mix',
+            help="Endpoint weights, e.g. home=50,api=30,admin=0 "
+                 "(endpoints: home, about, contact, api, post, admin)",
+        )
+        parser.add_argument(
+            '--mix-file',
+            help='JSON file with the whole mix, e.g. {"home": {"path": "/", "weight": 40}}',
+        )
+        parser.add_argument(
+            '--posts', type=int, default=100,
+            help="Number of newest published posts to pick post pages from (default: 100)",
+        )
+
+        # Ramp
+        parser.add_argument(
+            '--ramp', default='1,5,10,25',
+            help="Comma separated concurrency stages (default: 1,5,10,25)",
+        )
+        parser.add_argument(
+            '--stage-duration', type=float, default=10.0,
+            help="Seconds per stage (default: 10)",
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=10.0,
+            help="Seconds before a request counts as failed (default: 10)",
+        )
+        parser.add_argument(
+            '--no-compression', action='store_true',
+            help="Don't send Accept-Encoding",
+        )
+        parser.add_argument(
+            '--keep-alive', action='store_true',
+            help="Reuse connections between requests (slow against runserver, see README)",
+        )
+        parser.add_argument(
+            '--seed', type=int,
+            help="Random seed, to replay the same request sequence",
+        )
+
+        # Output
+        parser.add_argument(
+            '--per-endpoint', action='store_true',
+            help="Also print every endpoint of every stage",
+        )
+        parser.add_argument(
+            '--json',
+            help="Also write the results to this JSON file",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'], options['mix_file'])
+            ramp = [int(level) for level in options['ramp'].split(',') if level.strip()]
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(exc)
+        if not ramp or min(ramp) < 1:
+            raise CommandError("--ramp needs concurrency levels of at least 1")
+
+        # Post ids come from our own database
+        # NECESSARY: The server under test must use the same database
+        post_ids = list(
+            BlogPost.objects
+            .filter(is_published=True)
+            .order_by('-created_at')
+            .values_list('pk', flat=True)[:options['posts']]
+        )
+        if not post_ids and any('{post}' in path for path, _ in mix.values()):
+            self.stdout.write(self.style.WARNING("No published posts, leaving post pages out of the mix"))
+            mix = {name: entry for name, entry in mix.items() if '{post}' not in entry[0]}
+            if not mix:
+                raise CommandError("The traffic mix is empty")
+
+        total = sum(weight for _, weight in mix.values())
+        self.stdout.write(f"Target: {options['base_url']}")
+        self.stdout.write("Mix: " + ', '.join(
+            f"{name} {weight / total:.0%}" for name, (_, weight) in mix.items()
+        ))
+
+        self.stdout.write(
+            f"{'users':>6} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} "
+            f"{'p99 ms':>9} {'max ms':>9} {'errors':>7}"
+        )
+        results = []
+        for concurrency in ramp:
+            try:
+                stats = asyncio.run(run_stage(
+                    options['base_url'], mix, concurrency, options['stage_duration'],
+                    post_ids=post_ids,
+                    timeout=options['timeout'],
+                    compressed=not options['no_compression'],
+                    keep_alive=options['keep_alive'],
+                    seed=options['seed'],
+                ))
+            except ValueError as exc:
+                raise CommandError(exc)
+
+            summary = stats.summary()
+            self.write_row(f"{concurrency:>6}", summary)
+            endpoints = {name: stats.summary(name) for name in sorted(stats.latencies)}
+            if options['per_endpoint']:
+                for name, endpoint in endpoints.items():
+                    self.write_row(f"{name:>6}", endpoint)
+
+            # Show what went wrong, e.g. 500 or ConnectionRefusedError
+            for name, statuses in sorted(stats.statuses.items()):
+                bad = {str(status): count for status, count in statuses.items()
+                       if not isinstance(status, int) or status >= 400}
+                if bad:
+                    self.stdout.write(self.style.WARNING(f"       {name}: {bad}"))
+
+            results.append({
+                **summary,
+                'endpoints': endpoints,
+                'statuses': {name: {str(k): v for k, v in s.items()} for name, s in stats.statuses.items()},
+            })
+
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump({'base_url': options['base_url'], 'mix': mix, 'stages': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['json']}"))
+
+    def write_row(self, label, summary):
+        self.stdout.write(
+            f"{label} {summary['requests']:>9} {summary['rps']:>9.1f} {summary['p50']:>9.1f} "
+            f"{summary['p90']:>9.1f} {summary['p99']:>9.1f} {summary['max']:>9.1f} "
+            f"{summary['error_rate']:>7.1%}"
+        )
@@ -0,0 +1,222 @@
+# Management command that runs background tasks
+# python manage.py run_worker --concurrency 4
+# Stop it with Ctrl+C, running tasks are allowed to finish
+
+import datetime
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+# The tasks are registered by MainappConfig.ready()
+from mainapp.taskqueue import (
+    HEARTBEAT_SECONDS,
+    TaskMetrics,
+    claim_due,
+    heartbeat,
+    purge_finished,
+    queue_stats,
+    registered_tasks,
+    release,
+    requeue_stale,
+    run_task_in_worker,
+)
+
+
+class Command(BaseCommand):
+    """
+    Claim due tasks from the Task table and run them in a pool
+    """
+
+    help = "Run queued background tasks with a thread or process pool"
+
+    def add_arguments(self, parser):
+        # Pool settings
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help="Tasks run at the same time (default: 4)",
+        )
+        parser.add_argument(
+            '--executor', choices=['thread', 'process'], default='thread',
+            help="Thread pool for I/O-bound tasks, process pool for CPU-bound ones (default: thread)",
+        )
+
+        # Polling
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Seconds to wait when the queue is empty (default: 1)",
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60.0,
+            help="Seconds between metrics reports, 0 to disable (default: 60)",
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=300,
+            help="Requeue running tasks without a heartbeat for this many seconds (default: 300)",
+        )
+
+        # One-off modes
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Run every due task, then exit",
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help="Print per task type statistics for the last 24 hours from the Task table, then exit",
+        )
+        parser.add_argument(
+            '--purge', type=int, metavar='DAYS',
+            help="Delete finished tasks older than DAYS days, then exit",
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            return self.print_queue_stats()
+        if options['purge'] is not None:
+            deleted = purge_finished(options['purge'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} finished tasks"))
+            return
+
+        # Tasks left running by a worker that died
+        self.requeue(options['stale_after'])
+
+        concurrency = options['concurrency']
+        self.stdout.write(
+            f"Worker started: {concurrency} {options['executor']} workers, tasks: {', '.join(registered_tasks())}"
+        )
+        metrics = TaskMetrics()
+        try:
+            while True:
+                pool = self.make_pool(options['executor'], concurrency)
+                try:
+                    self.run(pool, concurrency, options, metrics)
+                    break
+                except BrokenProcessPool:
+                    # A child process died, e.g. killed for using too much memory
+                    # Its tasks were released by run(), start over with a new pool
+                    self.stderr.write("Process pool broke, starting a new one")
+                    time.sleep(options['poll_interval'])
+                finally:
+                    pool.shutdown(wait=True)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping, waiting for running tasks...")
+        finally:
+            self.print_metrics(metrics)
+
+    def make_pool(self, executor, concurrency):
+        """
+        Thread pool, or process pool with Django set up in every child
+        """
+        if executor == 'thread':
+            return ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='task')
+        # NECESSARY: Forked children must not share the parent's database connection
+        connections.close_all()
+        # NECESSARY: With the spawn and forkserver start methods (macOS, Windows,
+        # Linux from Python 3.14) children start without Django set up
+        # django.setup() also registers the tasks through MainappConfig.ready()
+        return ProcessPoolExecutor(max_workers=concurrency, initializer=django.setup)
+
+    def run(self, pool, concurrency, options, metrics):
+        """
+        Main loop: keep the pool full with due tasks
+        """
+        # Maps future to task id
+        running = {}
+        last_report = last_heartbeat = time.monotonic()
+
+        while True:
+            # Top the pool up
+            claimed = claim_due(concurrency - len(running))
+            for index, task_id in enumerate(claimed):
+                try:
+                    future = pool.submit(run_task_in_worker, task_id)
+                except BrokenProcessPool:
+                    # Nothing will finish these, hand them back to the queue
+                    release(claimed[index:] + list(running.values()), "Process pool broke")
+                    raise
+                running[future] = task_id
+
+            if not running:
+                # Nothing due and nothing running
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+            else:
+                # Wait for at least one task to finish
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                broken = []
+                for future in done:
+                    task_id = running.pop(future)
+                    try:
+                        metrics.record(future.result())
+                    except BrokenProcessPool:
+                        broken.append(task_id)
+                    except Exception as exc:
+                        # run_task records task errors itself, this is the worker failing
+                        self.stderr.write(f"Worker error: {exc!r}")
+                if broken:
+                    release(broken + list(running.values()), "Process pool broke")
+                    raise BrokenProcessPool()
+
+            # Tell other workers our tasks are alive, and pick up those of dead workers
+            if time.monotonic() - last_heartbeat >= HEARTBEAT_SECONDS:
+                heartbeat(list(running.values()))
+                self.requeue(options['stale_after'])
+                last_heartbeat = time.monotonic()
+
+            # Periodic metrics report
+            interval = options['stats_interval']
+            if interval and time.monotonic() - last_report >= interval:
+                self.print_metrics(metrics)
+                last_report = time.monotonic()
+
+    def requeue(self, stale_after):
+        """
+        Put back tasks of workers that stopped sending heartbeats
+        """
+        requeued, failed = requeue_stale(stale_after)
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale tasks"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"Failed {failed} stale tasks that were out of attempts"))
+
+    def print_metrics(self, metrics):
+        """
+        Throughput and latency of this worker, per task type
+        """
+        rows = metrics.rows()
+        if not rows:
+            return
+        self.stdout.write(
+            f"{'task':<24} {'done':>6} {'retry':>6} {'failed':>6} {'per sec':>8} "
+            f"{'avg ms':>9} {'max ms':>9} {'wait ms':>9}"
+        )
+        for name, done, retried, failed, rate, avg_ms, max_ms, wait_ms in rows:
+            self.stdout.write(
+                f"{name:<24} {done:>6} {retried:>6} {failed:>6} {rate:>8.2f} "
+                f"{avg_ms:>9.1f} {max_ms:>9.1f} {wait_ms:>9.1f}"
+            )
+
+    def print_queue_stats(self):
+        """
+        Statistics from the Task table, across all workers
+        """
+        since = timezone.now() - datetime.timedelta(hours=24)
+        self.stdout.write(
+            f"{'task':<24} {'total':>6} {'pending':>7} {'running':>7} {'done':>6} {'failed':>6} "
+            f"{'avg run ms':>10} {'max run ms':>10} {'avg queue ms':>12}"
+        )
+
+        def ms(duration):
+            return f"{duration.total_seconds() * 1000:.1f}" if duration is not None else '-'
+
+        for row in queue_stats(since):
+            self.stdout.write(
+                f"{row['name']:<24} {row['total']:>6} {row['pending']:>7} {row['running']:>7} "
+                f"{row['done']:>6} {row['failed']:>6} {ms(row['avg_run']):>10} "
+                f"{ms(row['max_run']):>10} {ms(row['avg_queue']):>12}"
+            )
@@ -0,0 +1,80 @@
+# Management command to warm the caches after a deploy
+# python manage.py warm_cache --host https://www.example.com
+# Run it once the new code is live, before traffic arrives
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from mainapp.warmup import cache_hosts, public_urls, warm
+
+
+class Command(BaseCommand):
+    """
+    Request every public page once so the page cache and the feed files
+    are ready before visitors arrive
+    """
+
+    help = "Crawl every page in mainapp/urls.py to fill the page cache and build the feed files"
+
+    def add_arguments(self, parser):
+        # How many requests at once
+        parser.add_argument(
+            '--concurrency', type=int, default=8,
+            help="Pages requested at the same time (default: 8)",
+        )
+
+        # How many post pages
+        parser.add_argument(
+            '--posts', type=int, default=100,
+            help="Newest published posts to warm (default: 100)",
+        )
+
+        # Extra pages, on top of WARM_CACHE_URLS
+        parser.add_argument(
+            '--url', action='append', default=[],
+            help="Extra path to warm (repeatable), e.g. a category page",
+        )
+
+        # The page cache is keyed by host, so warm the ones visitors use
+        parser.add_argument(
+            '--host', action='append', default=[],
+            help="Host or origin to warm for (repeatable), e.g. https://www.example.com "
+                 "(default: WARM_CACHE_HOSTS, or SITE_URL)",
+        )
+
+        # Report size
+        parser.add_argument(
+            '--top', type=int, default=10,
+            help="Number of slowest pages to list (default: 10)",
+        )
+
+    def handle(self, *args, **options):
+        # Collect the pages
+        urls = public_urls(posts=options['posts']) + options['url']
+        hosts = options['host'] or cache_hosts()
+
+        # Public pages as an anonymous visitor, once per host
+        started = time.perf_counter()
+        results = []
+        for host in hosts:
+            host_results = warm(urls, concurrency=options['concurrency'], host=host)
+            if len(hosts) > 1:
+                host_results = [(host.rstrip('/') + url, status, seconds) for url, status, seconds in host_results]
+            results += host_results
+        elapsed = time.perf_counter() - started
+        results.sort(key=lambda result: result[2], reverse=True)
+
+        # Slowest pages first
+        self.stdout.write(f"{'ms':>9}  {'status':<6}  url")
+        for url, status, seconds in results[:options['top']]:
+            self.stdout.write(f"{seconds * 1000:9.1f}  {status!s:<6}  {url}")
+
+        # Pages that didn't come back with 200
+        failed = [result for result in results if result[1] != 200]
+        for url, status, _ in failed:
+            self.stdout.write(self.style.WARNING(f"{url} returned {status}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(results) - len(failed)}/{len(results)} pages in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,279 @@
+# Custom middleware
+# Middleware runs on every request, before and after the view
+# Keep everything in here cheap
+# The session middleware lives in session_middleware.py, so public workers
+# that only use this file never import django.contrib.sessions
+
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+# Brotli is optional
+# Without it, responses are only gzipped
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def needs_session(path):
+    """
+    Whether a request path should get a real session
+    Only paths under SESSION_PATH_PREFIXES do
+    """
+    return path.startswith(tuple(settings.SESSION_PATH_PREFIXES))
+
+
+def carries_secrets(request, response):
+    """
+    Whether a response may hold a CSRF token or other per-user secrets
+    True on session paths (the admin) and wherever the CSRF token was used
+    """
+    if needs_session(request.path_info):
+        return True
+    # CsrfViewMiddleware sets the cookie whenever get_token() was called
+    return bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE')) or settings.CSRF_COOKIE_NAME in response.cookies
+
+
+# Content types worth compressing
+# Images, archives, fonts and the like are compressed already
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+def is_compressible(content_type):
+    """
+    Whether a Content-Type is text that compresses well
+    Includes +json and +xml types like application/rss+xml and application/atom+xml
+    """
+    content_type = content_type.split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(('+json', '+xml'))
+
+
+# Accept-Encoding parsing
+# Matches "gzip", "br;q=0.8", "*;q=0" and so on
+ACCEPT_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the best encoding the client accepts: 'br', 'gzip' or None
+    Brotli wins when both are acceptable, it is smaller at the same speed
+    """
+    # Read the q value of every listed encoding
+    accepted = {}
+    for item in accept_encoding.split(','):
+        match = ACCEPT_ENCODING_RE.fullmatch(item)
+        if match:
+            try:
+                accepted[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+
+    # An encoding is fine if listed with q > 0, or covered by "*"
+    wildcard = accepted.get('*', 0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    for encoding in candidates:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    """
+    Compress a whole body in one go
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    # wbits=31 writes a gzip header and trailer instead of raw zlib
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class _StreamCompressor:
+    """
+    Incremental compressor for streaming bodies
+    With `flush`, every chunk is flushed, so clients get data as soon as the
+    view yields it. Files don't need that, and compress better without it
+    """
+
+    def __init__(self, encoding, flush=True):
+        self.encoding = encoding
+        self.flush = flush
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        """
+        Compress one chunk, and flush it out if asked to
+        """
+        if self.encoding == 'br':
+            output = self.compressor.process(data)
+            return output + self.compressor.flush() if self.flush else output
+        output = self.compressor.compress(data)
+        return output + self.compressor.flush(zlib.Z_SYNC_FLUSH) if self.flush else output
+
+    def finish(self):
+        """
+        End the compressed stream
+        """
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class _LRUCache:
+    """
+    Small thread-safe LRU cache
+    Holds compressed bodies keyed by (path, ETag, encoding)
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)  # Most recently used goes last
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)  # Drop the least recently used
+
+
+def is_cacheable(response):
+    """
+    Whether a compressed body may be reused for later responses
+    Needs an ETag and a Cache-Control that allows shared caching
+    """
+    if not response.has_header('ETag'):
+        return False
+    cache_control = response.get('Cache-Control', '').lower()
+    if any(word in cache_control for word in ('private', 'no-store', 'no-cache')):
+        return False
+    return 'public' in cache_control or 'max-age' in cache_control
+
+
+# Compression middleware
+# NECESSARY: Goes near the top of MIDDLEWARE, so it runs last on the response
+# ConditionalGetMiddleware must come after it, so ETags are computed on the
+# uncompressed body
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli or gzip compression for HTML, JSON, XML and other text responses,
+    streaming ones included
+
+    Bodies smaller than COMPRESSION_MIN_SIZE are sent as they are, and so
+    are session pages and pages with a CSRF token (see BREACH). Compressed
+    bodies of cacheable responses are kept in an LRU cache keyed by path and
+    ETag, so a popular page is only compressed once per worker.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # One cache per worker process
+        self.cache = _LRUCache(settings.COMPRESSION_CACHE_SIZE)
+
+    def process_response(self, request, response):
+        # Already compressed, or not text
+        if response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type', '')):
+            return response
+        # NECESSARY: no-transform forbids changing the body, encoding included
+        if 'no-transform' in response.get('Cache-Control', '').lower():
+            return response
+        # NECESSARY: BREACH. A secret compressed next to echoed input, like ?q= in the admin,
+        # can be guessed from the response size. Django's GZipMiddleware pads against
+        # that, we simply don't compress such pages
+        if carries_secrets(request, response):
+            return response
+
+        # Too small to be worth it
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        # NECESSARY: The body now depends on Accept-Encoding, caches must know that
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        # Does the client take any encoding we support?
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # Compress chunk by chunk as the view produces them
+            # Generators are flushed per chunk, files are read as fast as they compress
+            compressor = _StreamCompressor(encoding, flush=not isinstance(response, FileResponse))
+            if response.is_async:
+                response.streaming_content = self._compress_async(response.streaming_content, compressor)
+            else:
+                response.streaming_content = self._compress_sync(response.streaming_content, compressor)
+            # The compressed length isn't known up front
+            del response.headers['Content-Length']
+        else:
+            # Reuse an earlier result for the same body
+            # NECESSARY: An ETag only identifies a body within one URL, two URLs may share one
+            cacheable = is_cacheable(response)
+            key = (request.get_full_path(), response['ETag'], encoding) if cacheable else None
+            compressed = self.cache.get(key) if cacheable else None
+            if compressed is None:
+                compressed = compress(response.content, encoding)
+                if cacheable:
+                    self.cache.set(key, compressed)
+
+            # Tiny or already compressed bodies can come out bigger
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag promises byte-identical bodies, which is no longer true
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _compress_sync(chunks, compressor):
+        """
+        Compress a normal iterator of chunks
+        """
+        for chunk in chunks:
+            data = compressor.chunk(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def _compress_async(chunks, compressor):
+        """
+        Compress an async iterator of chunks
+        """
+        async for chunk in chunks:
+            data = compressor.chunk(chunk)
+            if data:
+                yield data
+        yield compressor.finish()
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-19 18:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBlogPost',
+            fields=[
+                ('id', models.BigIntegerField(help_text='The id the post had in the BlogPost table', primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('content', models.TextField()),
+                ('author', models.CharField(default='Anonymous', max_length=100)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('updated_at', models.DateTimeField()),
+                ('is_published', models.BooleanField(default=False)),
+                ('view_count', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True, help_text='When the post was archived')),
+            ],
+            options={
+                'verbose_name': 'Archived Blog Post',
+                'verbose_name_plural': 'Archived Blog Posts',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('email', models.EmailField(max_length=254)),
+                ('text', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('is_approved', models.BooleanField(default=False)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='mainapp.archivedblogpost')),
+            ],
+            options={
+                'verbose_name': 'Archived Comment',
+                'verbose_name_plural': 'Archived Comments',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
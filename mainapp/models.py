@@ -6,6 +6,10 @@
 # NECESSARY: This is the base class for all models
 from django.db import models
 
+# Import reverse
+# For building post URLs from the URL name
+from django.urls import reverse
+
 # Import timezone
 # For datetime fields
 from django.utils import timezone
@@ -78,7 +82,12 @@ class BlogPost(models.Model):
         default=0,  # Starts at 0
         help_text="Number of times the post was viewed"
     )
-    
+
+    # Archive flag
+    # Not a database column, just a class attribute
+    # ArchivedBlogPost sets this to True so templates can tell them apart
+    is_archived = False
+
     # Meta class
     # NECESSARY: Defines metadata for the model
     class Meta:
@@ -102,6 +111,11 @@ class BlogPost(models.Model):
         # Return the title
         # This is what you see in admin
         return self.title
+
+    # URL of the post
+    # Used by the sitemap, the feeds and the admin "View on site" link
+    def get_absolute_url(self):
+        return reverse('post_detail', args=[self.pk])
     
     # Custom method
     # Not a built-in Django method
@@ -240,8 +254,226 @@ class Category(models.Model):
         return self.name
 
 
+# Related post model
+# Precomputed "related posts" for each post
+# Filled by the build_related_posts command, see mainapp/recommendations.py
+class RelatedPost(models.Model):
+    """
+    Related post model
+    One row per (post, related post) pair, ranked by similarity
+    """
+
+    # The post the recommendation is shown on
+    # NECESSARY: Indexed by the foreign key, so the post page reads it in one query
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name='related_links',
+    )
+
+    # The recommended post
+    # related_name='+' because we never need the reverse lookup
+    related = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    # Cosine similarity of the two posts, between 0 and 1
+    score = models.FloatField()
+
+    # Position in the list, 1 is the most similar
+    rank = models.PositiveSmallIntegerField()
+
+    # Meta class
+    class Meta:
+        # Best match first
+        ordering = ['post', 'rank']
+
+        # One post per rank
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='unique_related_rank'),
+        ]
+
+        # Verbose names
+        verbose_name = "Related Post"
+        verbose_name_plural = "Related Posts"
+
+    # String representation
+    def __str__(self):
+        return f"{self.post_id} -> {self.related_id} ({self.score:.2f})"
+
+
+# Archived blog post model
+# Cold storage for old posts moved out of the BlogPost table
+# See mainapp/archive.py for the code that fills it
+class ArchivedBlogPost(models.Model):
+    """
+    Archived blog post model
+    Same columns as BlogPost, keeps the original primary key
+    """
+
+    # Primary key
+    # NECESSARY: Not auto-generated, we copy the BlogPost id
+    # So old links like /posts/<id>/ keep working after archiving
+    id = models.BigIntegerField(
+        primary_key=True,
+        help_text="The id the post had in the BlogPost table"
+    )
+
+    # Same fields as BlogPost
+    # No auto_now here, the original timestamps are copied over
+    title = models.CharField(max_length=200)
+    content = models.TextField()
+    author = models.CharField(max_length=100, default="Anonymous")
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    is_published = models.BooleanField(default=False)
+    view_count = models.IntegerField(default=0)
+
+    # Archived date
+    # When the post was moved to the archive
+    archived_at = models.DateTimeField(
+        auto_now_add=True,  # Set when archived
+        help_text="When the post was archived"
+    )
+
+    # Archive flag
+    # Mirrors BlogPost.is_archived
+    is_archived = True
+
+    # Meta class
+    class Meta:
+        # Same ordering as BlogPost
+        ordering = ['-created_at']
+
+        # Verbose names
+        verbose_name = "Archived Blog Post"
+        verbose_name_plural = "Archived Blog Posts"
+
+    # String representation
+    def __str__(self):
+        return self.title
+
+    # Same URL as the live post
+    # The post page falls through to the archive
+    def get_absolute_url(self):
+        return reverse('post_detail', args=[self.pk])
+
+
+# Archived comment model
+# Comments are archived together with their post
+class ArchivedComment(models.Model):
+    """
+    Archived comment model
+    Same columns as Comment, keeps the original primary key
+    """
+
+    # Primary key
+    # Copied from the Comment table
+    id = models.BigIntegerField(primary_key=True)
+
+    # Foreign key to the archived post
+    # NECESSARY: Archived comments belong to archived posts
+    post = models.ForeignKey(
+        ArchivedBlogPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+    )
+
+    # Same fields as Comment
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    text = models.TextField()
+    created_at = models.DateTimeField()
+    is_approved = models.BooleanField(default=False)
+
+    # Meta class
+    class Meta:
+        # Oldest first, like Comment
+        ordering = ['created_at']
+
+        # Verbose names
+        verbose_name = "Archived Comment"
+        verbose_name_plural = "Archived Comments"
+
+    # String representation
+    def __str__(self):
+        return f"Archived comment by {self.name}"
+
+
+# Background task model
+# One row per piece of deferred work
+# Added with mainapp.taskqueue.enqueue(), run by `python manage.py run_worker`
+class Task(models.Model):
+    """
+    Background task model
+    The database is the queue, so no extra service is needed
+    """
+
+    # Task states
+    PENDING = 'pending'  # Waiting for run_at
+    RUNNING = 'running'  # Claimed by a worker
+    DONE = 'done'  # Finished successfully
+    FAILED = 'failed'  # Gave up after max_attempts
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Registered task name, see mainapp/tasks.py
+    name = models.CharField(max_length=100, db_index=True)
+
+    # Keyword arguments for the task function
+    payload = models.JSONField(default=dict, blank=True)
+
+    # Current state
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+
+    # Retry bookkeeping
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+
+    # Earliest time the task may run
+    # Pushed back after every failed attempt
+    run_at = models.DateTimeField(default=timezone.now)
+
+    # Which worker batch claimed it
+    claimed_by = models.CharField(max_length=100, blank=True)
+
+    # Timestamps for the metrics
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Last sign of life from the worker running it
+    # Running tasks without a recent heartbeat belong to a dead worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    # Traceback of the last failure
+    last_error = models.TextField(blank=True)
+
+    # Meta class
+    class Meta:
+        # Oldest work first
+        ordering = ['run_at']
+
+        # NECESSARY: Workers poll for due pending tasks all the time
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at'),
+        ]
+
+        # Verbose names
+        verbose_name = "Task"
+        verbose_name_plural = "Tasks"
+
+    # String representation
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
 # End of models file
-# These models aren't used in the views yet
-# But they're here for demonstration
-# You can use them in Django admin
-# Or create views to display them
+# BlogPost and Comment back the post pages and the comment endpoint
+# The other models are managed through Django admin and the management commands
@@ -0,0 +1,158 @@
+# Related posts
+# Builds TF-IDF vectors of every published post with NumPy,
+# finds the most similar posts with batched matrix products,
+# and stores the results in the RelatedPost table
+# The post page only reads that table, it never computes anything
+
+import math
+import re
+from collections import Counter
+
+# NECESSARY: NumPy does the vector maths
+import numpy as np
+
+from django.db import transaction
+
+from .models import BlogPost, RelatedPost
+
+
+# Defaults for the build
+DEFAULT_TOP_K = 5  # Related posts stored per post
+DEFAULT_BATCH_SIZE = 256  # Posts compared per matrix product
+
+# Vocabulary size
+# NECESSARY: The TF-IDF matrix is dense, posts x features float32
+# That is 8 MB per 1,000 posts at 2048 features, about 800 MB at 100,000 posts
+# Lower max_features for large blogs, memory grows linearly with both
+DEFAULT_MAX_FEATURES = 2048
+
+# Words are runs of letters and digits, at least two characters long
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+
+# Common English words that say nothing about the topic
+STOP_WORDS = frozenset('''
+    about after again all also an and any are as at be because been before but by
+    can could did do does for from had has have he her here him his how if in into
+    is it its just me more most my no not of on one only or other our out over she
+    so some such than that the their them then there these they this those to too
+    up us very was we were what when where which while who why will with would you your
+'''.split())
+
+
+def tokenize(text):
+    """
+    Split text into lowercase words, without stop words
+    """
+    return [word for word in TOKEN_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+def tfidf_matrix(documents, max_features=DEFAULT_MAX_FEATURES):
+    """
+    Build an L2-normalised TF-IDF matrix, one row per document
+    Only the `max_features` words found in the most documents are used
+    """
+    # Count words per document, and documents per word
+    counts = [Counter(tokenize(document)) for document in documents]
+    document_frequency = Counter()
+    for words in counts:
+        document_frequency.update(words.keys())
+
+    # Vocabulary: the most widespread words
+    vocabulary = {word: i for i, (word, _) in enumerate(document_frequency.most_common(max_features))}
+
+    # Fill the term frequencies
+    # Sublinear tf (1 + log count) stops one repeated word dominating a post
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    for row, words in enumerate(counts):
+        columns = [vocabulary[word] for word in words if word in vocabulary]
+        values = [1.0 + math.log(words[word]) for word in words if word in vocabulary]
+        matrix[row, columns] = values
+
+    # Inverse document frequency, smoothed like scikit-learn does it
+    n = len(documents)
+    df = np.array([document_frequency[word] for word in vocabulary], dtype=np.float32)
+    matrix *= np.log((1 + n) / (1 + df)) + 1
+
+    # Normalise every row to length 1
+    # NECESSARY: Then a dot product is the cosine similarity
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1  # Empty posts stay all zeros
+    matrix /= norms
+    return matrix
+
+
+def top_k_neighbours(matrix, top_k=DEFAULT_TOP_K, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Yield (row, [(neighbour_row, score), ...]) for every row of `matrix`
+    Neighbours are sorted by cosine similarity, best first
+    """
+    n = matrix.shape[0]
+    k = min(top_k, n - 1)
+    if k <= 0:
+        return
+
+    # Compare a batch of rows against all rows at once
+    # Memory is batch_size x n floats, not n x n
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        scores = matrix[start:stop] @ matrix.T
+
+        # A post is not related to itself
+        rows = np.arange(stop - start)
+        scores[rows, rows + start] = -np.inf
+
+        # argpartition finds the k best without sorting the whole row
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+
+        # Now sort just those k
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+
+        for offset in range(stop - start):
+            yield start + offset, list(zip(best[offset].tolist(), best_scores[offset].tolist()))
+
+
+def build_related_posts(top_k=DEFAULT_TOP_K, max_features=DEFAULT_MAX_FEATURES,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute the RelatedPost table for all published posts
+    Returns the number of rows written
+    """
+    # Load only what the vectors need
+    posts = list(
+        BlogPost.objects
+        .filter(is_published=True)
+        .order_by('pk')
+        .values_list('pk', 'title', 'content')
+    )
+    ids = [pk for pk, _, _ in posts]
+
+    # The title is repeated so its words count twice as much as the body's
+    documents = [f'{title} {title} {content}' for _, title, content in posts]
+
+    # Build the rows
+    rows = []
+    if posts:
+        matrix = tfidf_matrix(documents, max_features=max_features)
+        for row, neighbours in top_k_neighbours(matrix, top_k=top_k, batch_size=batch_size):
+            rank = 0
+            for neighbour, score in neighbours:
+                # Posts with no words in common aren't related
+                if score <= 0:
+                    break
+                rank += 1
+                rows.append(RelatedPost(
+                    post_id=ids[row],
+                    related_id=ids[neighbour],
+                    score=score,
+                    rank=rank,
+                ))
+
+    # Swap the whole table in one transaction
+    # NECESSARY: Readers see either the old recommendations or the new ones
+    with transaction.atomic():
+        RelatedPost.objects.all().delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,34 @@
+# Session middleware
+# Kept out of middleware.py, because importing it loads django.contrib.sessions,
+# which the public-only workers (myproject.settings_public) don't need
+
+from django.contrib.sessions.middleware import SessionMiddleware
+
+from .middleware import needs_session
+
+
+# Session middleware that only loads sessions where they are used
+# NECESSARY: Replaces django.contrib.sessions.middleware.SessionMiddleware in MIDDLEWARE
+class PathScopedSessionMiddleware(SessionMiddleware):
+    """
+    Session middleware limited to SESSION_PATH_PREFIXES (the admin by default)
+
+    Other paths get an empty session that is never loaded or saved, even if
+    the browser sends a session cookie. request.user is then always
+    AnonymousUser there, and no request touches the session store.
+    """
+
+    def process_request(self, request):
+        # Admin and other session paths work as usual
+        if needs_session(request.path_info):
+            return super().process_request(request)
+
+        # Everyone else gets a session with no key
+        # Reading a session with no key returns {} without touching storage
+        request.session = self.SessionStore()
+
+    def process_response(self, request, response):
+        # Nothing to save or set a cookie for on public paths
+        if not needs_session(request.path_info):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,282 @@
+# Comment spam pre-filter
+# Runs before a comment is saved, without writing to the database
+# Obvious spam is rejected so it never reaches the moderation queue
+#
+# Three checks:
+# 1. A Bloom filter of known spam emails, email domains and link hosts,
+#    loaded from SPAM_BLOCKLIST_PATH
+# 2. Near-duplicate text, using bottom-k sketches of word shingles
+#    Texts shorter than one shingle are skipped, "Thanks!" is not spam
+# 3. Too many links in one comment
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+
+# Links in comment text
+# Either with a scheme or starting with www.
+URL_RE = re.compile(r'(?:https?://|www\.)[^\s<>"\']+', re.IGNORECASE)
+
+# Words for shingling
+WORD_RE = re.compile(r'\w+')
+
+# Words per shingle
+# Five words is long enough that unrelated comments rarely share one
+SHINGLE_SIZE = 5
+
+# Hashes kept per sketch
+SKETCH_SIZE = 64
+
+
+def _hash64(value):
+    """
+    Stable 64-bit hash of a string
+    NECESSARY: Python's hash() changes between processes
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class BloomFilter:
+    """
+    Compact set membership test with no false negatives
+
+    Uses about 10 bits per item at a 1% false positive rate, or 15 bits at
+    0.1%, instead of storing every string.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        # Optimal size and number of hashes for the capacity and error rate
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        """
+        Bit positions for an item
+        Double hashing: two 64-bit hashes give as many positions as needed
+        """
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def host_key(url):
+    """
+    Normalise a link to its host: lowercase, no scheme, port or "www."
+    """
+    if '://' not in url:
+        url = 'http://' + url
+    host = (urlsplit(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def email_keys(email):
+    """
+    Blocklist keys for an email: the full address and "@domain"
+    """
+    email = email.strip().lower()
+    keys = [email]
+    if '@' in email:
+        keys.append('@' + email.rsplit('@', 1)[1])
+    return keys
+
+
+def load_blocklist(path):
+    """
+    Build a Bloom filter from a blocklist file
+    One entry per line: an email, an @domain, or a URL or host name
+    Blank lines and lines starting with # are skipped
+    """
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entries.append(line.lower() if '@' in line else host_key(line))
+
+    # 0.1% false positives, so real comments are almost never caught
+    bloom = BloomFilter(len(entries), error_rate=0.001)
+    for entry in entries:
+        bloom.add(entry)
+    return bloom
+
+
+# Blocklist cache
+# Reloaded when the file changes, so updates don't need a restart
+_blocklist = None
+_blocklist_mtime = None
+_blocklist_lock = threading.Lock()
+
+
+def get_blocklist():
+    """
+    The current blocklist, or None if there is no blocklist file
+    """
+    global _blocklist, _blocklist_mtime
+    path = settings.SPAM_BLOCKLIST_PATH
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    with _blocklist_lock:
+        if mtime != _blocklist_mtime:
+            _blocklist = load_blocklist(path)
+            _blocklist_mtime = mtime
+        return _blocklist
+
+
+def sketch(text):
+    """
+    Bottom-k sketch of a text's word shingles
+    The SKETCH_SIZE smallest shingle hashes, which estimate Jaccard similarity
+    Empty for texts under SHINGLE_SIZE words: short replies like
+    "Great post, thanks!" are written by many different people
+    """
+    words = WORD_RE.findall(text.lower())
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    return frozenset(sorted(_hash64(shingle) for shingle in shingles)[:SKETCH_SIZE])
+
+
+def similarity(a, b):
+    """
+    Estimated Jaccard similarity of the texts behind two sketches
+    """
+    if not a or not b:
+        return 0.0
+    # The k smallest hashes of the union, and how many both sketches share
+    k = min(SKETCH_SIZE, len(a | b))
+    union = sorted(a | b)[:k]
+    shared = sum(1 for h in union if h in a and h in b)
+    return shared / k
+
+
+class DuplicateDetector:
+    """
+    Remembers sketches of recent comments to catch copy-pasted spam
+    Seeded from the Comment table, then topped up with comments saved
+    by other workers, so duplicates split across workers are caught too
+    """
+
+    def __init__(self, history):
+        self.sketches = deque(maxlen=history)
+        self.lock = threading.Lock()
+        # Newest comment id read from the database
+        self.last_pk = 0
+        # Ids this process already remembered, skipped on the next refresh
+        self.local_pks = set()
+        self.refreshed_at = None
+
+    def is_duplicate(self, text, threshold):
+        candidate = sketch(text)
+        if not candidate:
+            return False
+        with self.lock:
+            return any(similarity(candidate, seen) >= threshold for seen in self.sketches)
+
+    def remember(self, text, pk=None):
+        candidate = sketch(text)
+        with self.lock:
+            if candidate:
+                self.sketches.append(candidate)
+            if pk is not None:
+                self.local_pks.add(pk)
+
+    def refresh(self):
+        """
+        Read comments saved since the last refresh, newest `history` at most
+        One query on the primary key
+        """
+        from .models import Comment  # NECESSARY: spam.py is imported before the models are ready
+
+        rows = list(
+            Comment.objects
+            .filter(pk__gt=self.last_pk)
+            .order_by('-pk')
+            .values_list('pk', 'text')[:self.sketches.maxlen]
+        )
+        # Sketch outside the lock, oldest first so the deque keeps the newest
+        sketches = [(pk, sketch(text)) for pk, text in reversed(rows)]
+        with self.lock:
+            for pk, candidate in sketches:
+                if candidate and pk not in self.local_pks:
+                    self.sketches.append(candidate)
+            if rows:
+                self.last_pk = max(self.last_pk, rows[0][0])
+            self.local_pks = {pk for pk in self.local_pks if pk > self.last_pk}
+            self.refreshed_at = time.monotonic()
+
+
+# Recent comments in this process
+_duplicates = None
+_duplicates_lock = threading.Lock()
+
+
+def get_duplicate_detector():
+    """
+    The duplicate detector, created on first use
+    Refreshed from the database every SPAM_DUPLICATE_REFRESH seconds
+    """
+    global _duplicates
+    with _duplicates_lock:
+        if _duplicates is None:
+            _duplicates = DuplicateDetector(settings.SPAM_DUPLICATE_HISTORY)
+        detector = _duplicates
+        due = (
+            detector.refreshed_at is None
+            or time.monotonic() - detector.refreshed_at >= settings.SPAM_DUPLICATE_REFRESH
+        )
+        if due:
+            detector.refresh()
+        return detector
+
+
+def check_comment(email, text):
+    """
+    Run every spam check on a new comment
+    Returns the reason it was rejected, or None if it looks fine
+    """
+    links = URL_RE.findall(text)
+
+    # Too many links
+    if len(links) > settings.SPAM_MAX_LINKS:
+        return "Too many links"
+
+    # Known spam senders and link hosts
+    blocklist = get_blocklist()
+    if blocklist is not None:
+        if any(key in blocklist for key in email_keys(email)):
+            return "Blocked sender"
+        if any(host_key(link) in blocklist for link in links):
+            return "Blocked link"
+
+    # Same text as a recent comment
+    if get_duplicate_detector().is_duplicate(text, settings.SPAM_DUPLICATE_THRESHOLD):
+        return "Duplicate comment"
+
+    return None
+
+
+def remember_comment(text, pk=None):
+    """
+    Record an accepted comment for duplicate detection
+    `pk` keeps the next refresh from adding it a second time
+    """
+    get_duplicate_detector().remember(text, pk)
@@ -0,0 +1,295 @@
+# Background task queue
+# Tasks are rows in the Task table
+# Views call enqueue() and return straight away,
+# `python manage.py run_worker` claims due tasks and runs them
+
+import datetime
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Q
+from django.utils import timezone
+
+from .models import Task
+
+
+# How often a worker marks its running tasks as alive, in seconds
+HEARTBEAT_SECONDS = 30
+
+# Registered task functions
+# Maps task name to (function, max_attempts)
+_registry = {}
+
+
+def task(name=None, max_attempts=5):
+    """
+    Decorator that registers a function as a task
+    The function gets the payload as keyword arguments
+    """
+    def register(func):
+        _registry[name or func.__name__] = (func, max_attempts)
+        return func
+    return register
+
+
+def registered_tasks():
+    """
+    Names of all registered tasks
+    """
+    return sorted(_registry)
+
+
+def enqueue(name, delay=0, max_attempts=None, **payload):
+    """
+    Add a task to the queue and return the Task row
+    One INSERT, the work itself happens in the worker
+    The payload must be JSON serialisable
+    """
+    # The max_attempts of the registered task, if this process knows it
+    if max_attempts is None:
+        max_attempts = _registry.get(name, (None, 5))[1]
+
+    task_row = Task.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + datetime.timedelta(seconds=delay),
+    )
+
+    # Run straight away when the queue is in eager mode, e.g. in development
+    # NECESSARY: Claimed first like a worker would, so the attempt counts
+    # and a failure is retried or failed by the usual rules, not run again as new
+    if settings.TASKS_EAGER:
+        now = timezone.now()
+        Task.objects.filter(pk=task_row.pk).update(
+            status=Task.RUNNING,
+            claimed_by='eager',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        run_task(task_row.pk)
+        task_row.refresh_from_db()
+    return task_row
+
+
+def claim_due(limit):
+    """
+    Claim up to `limit` due tasks for this worker
+    Returns the ids of the claimed tasks
+    """
+    if limit <= 0:
+        return []
+
+    # Candidates, oldest first
+    now = timezone.now()
+    candidates = list(
+        Task.objects
+        .filter(status=Task.PENDING, run_at__lte=now)
+        .order_by('run_at')
+        .values_list('pk', flat=True)[:limit]
+    )
+    if not candidates:
+        return []
+
+    # NECESSARY: The status check in the UPDATE makes the claim atomic
+    # If two workers race for a task, only one UPDATE matches it
+    token = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+    Task.objects.filter(pk__in=candidates, status=Task.PENDING).update(
+        status=Task.RUNNING,
+        claimed_by=token,
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return list(Task.objects.filter(claimed_by=token, status=Task.RUNNING).values_list('pk', flat=True))
+
+
+def backoff_seconds(attempts):
+    """
+    Delay before the next attempt
+    Doubles every time: base, 2x base, 4x base ... up to the maximum
+    """
+    return min(settings.TASKS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.TASKS_RETRY_MAX_SECONDS)
+
+
+def run_task(task_id):
+    """
+    Run one claimed task and record the result
+    Returns a dict with the outcome, used for the worker metrics
+    """
+    task_row = Task.objects.get(pk=task_id)
+    started = time.monotonic()
+    wait = (timezone.now() - task_row.run_at).total_seconds()
+    outcome = {'name': task_row.name, 'wait': max(wait, 0.0)}
+
+    try:
+        func, _ = _registry[task_row.name]
+        func(**task_row.payload)
+    except Exception:
+        error = traceback.format_exc()
+        outcome['runtime'] = time.monotonic() - started
+
+        # Out of attempts, or a task nobody registered
+        if task_row.attempts >= task_row.max_attempts or task_row.name not in _registry:
+            Task.objects.filter(pk=task_id).update(
+                status=Task.FAILED, finished_at=timezone.now(), last_error=error,
+            )
+            outcome['result'] = 'failed'
+        else:
+            # Try again later
+            Task.objects.filter(pk=task_id).update(
+                status=Task.PENDING,
+                claimed_by='',
+                run_at=timezone.now() + datetime.timedelta(seconds=backoff_seconds(task_row.attempts)),
+                last_error=error,
+            )
+            outcome['result'] = 'retried'
+    else:
+        outcome['runtime'] = time.monotonic() - started
+        Task.objects.filter(pk=task_id).update(status=Task.DONE, finished_at=timezone.now())
+        outcome['result'] = 'done'
+
+    return outcome
+
+
+def run_task_in_worker(task_id):
+    """
+    run_task for worker threads and processes
+    NECESSARY: Each worker thread has its own connection, drop it if it went stale
+    Top-level function so process pools can pickle it
+    """
+    close_old_connections()
+    try:
+        return run_task(task_id)
+    finally:
+        close_old_connections()
+
+
+def release(task_ids, error):
+    """
+    Hand claimed tasks back when the worker can't run them
+    The attempt still counts, so a task that keeps crashing the pool fails in the end
+    """
+    if not task_ids:
+        return
+    running = Task.objects.filter(pk__in=task_ids, status=Task.RUNNING)
+    running.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=timezone.now(), last_error=error,
+    )
+    running.update(status=Task.PENDING, claimed_by='', last_error=error)
+
+
+def heartbeat(task_ids):
+    """
+    Mark running tasks as still alive
+    Called by the worker every HEARTBEAT_SECONDS
+    """
+    if task_ids:
+        Task.objects.filter(pk__in=task_ids, status=Task.RUNNING).update(heartbeat_at=timezone.now())
+
+
+def requeue_stale(older_than):
+    """
+    Put back running tasks whose worker stopped sending heartbeats
+    `older_than` seconds without one means the worker died
+    Long tasks on a healthy worker keep their heartbeat fresh and stay put
+    Returns (tasks requeued, tasks failed)
+    """
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    silent = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    stale = Task.objects.filter(silent, status=Task.RUNNING)
+
+    # NECESSARY: Same rule as release(), a task that keeps killing its worker
+    # (e.g. out of memory) fails in the end instead of being retried forever
+    error = "The worker stopped sending heartbeats"
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, finished_at=timezone.now(), last_error=error,
+    )
+    requeued = stale.update(status=Task.PENDING, claimed_by='', last_error=error)
+    return requeued, failed
+
+
+def purge_finished(days):
+    """
+    Delete finished tasks older than `days` days
+    Failed tasks are kept for inspection
+    Returns the number of tasks deleted
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    deleted, _ = Task.objects.filter(status=Task.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class TaskMetrics:
+    """
+    Throughput and latency per task type for one worker
+    Thread-safe, the worker records an outcome after every task
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: {
+            'done': 0, 'retried': 0, 'failed': 0,
+            'runtime': 0.0, 'max_runtime': 0.0, 'wait': 0.0,
+        })
+
+    def record(self, outcome):
+        with self.lock:
+            stats = self.stats[outcome['name']]
+            stats[outcome['result']] += 1
+            stats['runtime'] += outcome['runtime']
+            stats['max_runtime'] = max(stats['max_runtime'], outcome['runtime'])
+            stats['wait'] += outcome['wait']
+
+    def rows(self):
+        """
+        One row per task type:
+        (name, done, retried, failed, tasks/sec, avg run ms, max run ms, avg wait ms)
+        """
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        with self.lock:
+            rows = []
+            for name, stats in sorted(self.stats.items()):
+                runs = stats['done'] + stats['retried'] + stats['failed']
+                rows.append((
+                    name, stats['done'], stats['retried'], stats['failed'],
+                    runs / elapsed,
+                    stats['runtime'] / runs * 1000,
+                    stats['max_runtime'] * 1000,
+                    stats['wait'] / runs * 1000,
+                ))
+            return rows
+
+
+def queue_stats(since):
+    """
+    Per task type statistics from the Task table, for tasks created after `since`
+    Returns a list of dicts
+    """
+    run_time = ExpressionWrapper(F('finished_at') - F('started_at'), output_field=DurationField())
+    queue_time = ExpressionWrapper(F('started_at') - F('created_at'), output_field=DurationField())
+    return list(
+        Task.objects
+        .filter(created_at__gte=since)
+        .values('name')
+        .annotate(
+            total=Count('pk'),
+            pending=Count('pk', filter=Q(status=Task.PENDING)),
+            running=Count('pk', filter=Q(status=Task.RUNNING)),
+            done=Count('pk', filter=Q(status=Task.DONE)),
+            failed=Count('pk', filter=Q(status=Task.FAILED)),
+            avg_run=Avg(run_time, filter=Q(status=Task.DONE)),
+            max_run=Max(run_time, filter=Q(status=Task.DONE)),
+            avg_queue=Avg(queue_time, filter=Q(status=Task.DONE)),
+        )
+        .order_by('name')
+    )
@@ -0,0 +1,45 @@
+# Background tasks
+# Every function here can be queued with mainapp.taskqueue.enqueue(name, **payload)
+# The worker imports this module to register them
+# Heavy modules are imported inside the tasks, so enqueueing stays cheap
+
+from .taskqueue import task
+
+
+# Write buffered post views
+# Queued by mainapp.counters when a web worker's buffer is full
+@task('apply_view_counts')
+def apply_view_counts(counts):
+    from .counters import apply_view_counts as apply
+    # JSON turns the post ids into strings
+    apply({int(pk): views for pk, views in counts.items()})
+
+
+# Rebuild the sitemap and feed files
+@task('build_feeds')
+def build_feeds(force=False):
+    from .feeds import build_all
+    build_all(force=force)
+
+
+# Recompute related posts
+@task('build_related_posts', max_attempts=2)
+def build_related_posts(**options):
+    from .recommendations import build_related_posts as build
+    build(**options)
+
+
+# Move old posts into the archive
+@task('archive_old_posts', max_attempts=3)
+def archive_old_posts(months=12):
+    from .archive import archive_old_posts as archive
+    archive(months=months)
+
+
+# Warm the public page caches, e.g. right after a deploy
+@task('warm_cache', max_attempts=1)
+def warm_cache(posts=100, concurrency=8):
+    from .warmup import cache_hosts, public_urls, warm
+    urls = public_urls(posts=posts)
+    for host in cache_hosts():
+        warm(urls, concurrency=concurrency, host=host)
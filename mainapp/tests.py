@@ -1,3 +1,605 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import functools
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware, get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archive, counters, feeds, loadtest, recommendations, spam, taskqueue
+from .middleware import CompressionMiddleware
+from .models import ArchivedBlogPost, ArchivedComment, BlogPost, Comment, RelatedPost, Task
+
+
+class TaskQueueTests(TestCase):
+    """
+    Background task queue: registration, eager mode, retries
+    """
+
+    def setUp(self):
+        # A task that always fails, removed again after the test
+        def always_fails():
+            raise RuntimeError("boom")
+        taskqueue.task('always_fails', max_attempts=2)(always_fails)
+        self.addCleanup(taskqueue._registry.pop, 'always_fails', None)
+
+    def test_tasks_are_registered_without_importing_them(self):
+        # MainappConfig.ready() imports mainapp.tasks
+        self.assertIn('apply_view_counts', taskqueue.registered_tasks())
+        self.assertEqual(taskqueue.enqueue('build_related_posts').max_attempts, 2)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_view_counts(self):
+        post = BlogPost.objects.create(title='Post', content='Text')
+        counters.take_pending()  # Start from an empty buffer
+        counters._pending[post.pk] += 3
+        counters.queue_view_counts()
+
+        post.refresh_from_db()
+        self.assertEqual(post.view_count, 3)
+        self.assertEqual(Task.objects.get().status, Task.DONE)
+
+    def test_retry_then_fail(self):
+        task_row = taskqueue.enqueue('always_fails')
+
+        # First attempt: back to pending, later
+        self.assertEqual(taskqueue.claim_due(10), [task_row.pk])
+        self.assertEqual(taskqueue.run_task(task_row.pk)['result'], 'retried')
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.PENDING)
+        self.assertEqual(task_row.attempts, 1)
+        self.assertGreater(task_row.run_at, timezone.now())
+        self.assertIn('boom', task_row.last_error)
+
+        # Not due yet
+        self.assertEqual(taskqueue.claim_due(10), [])
+
+        # Second and last attempt: failed for good
+        Task.objects.filter(pk=task_row.pk).update(run_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(taskqueue.claim_due(10), [task_row.pk])
+        self.assertEqual(taskqueue.run_task(task_row.pk)['result'], 'failed')
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.FAILED)
+        self.assertEqual(task_row.attempts, 2)
+        self.assertIsNotNone(task_row.finished_at)
+
+    def test_unknown_task_fails_at_once(self):
+        task_row = taskqueue.enqueue('no_such_task')
+        taskqueue.claim_due(10)
+        self.assertEqual(taskqueue.run_task(task_row.pk)['result'], 'failed')
+
+    def test_requeue_only_silent_tasks(self):
+        alive = taskqueue.enqueue('always_fails')
+        dead = taskqueue.enqueue('always_fails')
+        taskqueue.claim_due(10)
+
+        # Both started long ago, only one worker is still sending heartbeats
+        long_ago = timezone.now() - datetime.timedelta(hours=2)
+        Task.objects.update(started_at=long_ago, heartbeat_at=long_ago)
+        taskqueue.heartbeat([alive.pk])
+
+        self.assertEqual(taskqueue.requeue_stale(300), (1, 0))
+        self.assertEqual(Task.objects.get(pk=alive.pk).status, Task.RUNNING)
+        self.assertEqual(Task.objects.get(pk=dead.pk).status, Task.PENDING)
+
+    def test_stale_task_out_of_attempts_fails(self):
+        # A task that killed its worker on the last attempt, e.g. out of memory
+        task_row = taskqueue.enqueue('always_fails')
+        long_ago = timezone.now() - datetime.timedelta(hours=2)
+        Task.objects.filter(pk=task_row.pk).update(
+            status=Task.RUNNING, attempts=2, started_at=long_ago, heartbeat_at=long_ago,
+        )
+
+        self.assertEqual(taskqueue.requeue_stale(300), (0, 1))
+        self.assertEqual(Task.objects.get(pk=task_row.pk).status, Task.FAILED)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_failure_counts_as_an_attempt(self):
+        task_row = taskqueue.enqueue('always_fails')
+        self.assertEqual(task_row.attempts, 1)
+        self.assertEqual(task_row.status, Task.PENDING)
+        self.assertGreater(task_row.run_at, timezone.now())
+
+        task_row = taskqueue.enqueue('always_fails', max_attempts=1)
+        self.assertEqual(task_row.status, Task.FAILED)
+
+
+class ViewCounterTests(TransactionTestCase):
+    """
+    Buffered post views reach the queue even when no more views arrive
+    """
+
+    @override_settings(VIEW_COUNT_FLUSH_THRESHOLD=100, VIEW_COUNT_FLUSH_INTERVAL=0.05)
+    def test_quiet_buffer_is_queued_by_timer(self):
+        post = BlogPost.objects.create(title='Post', content='Text')
+        counters.take_pending()
+        counters.record_view(post.pk)
+        counters.record_view(post.pk)
+        timer = counters._timer
+        timer.join(5)
+
+        task_row = Task.objects.get(name='apply_view_counts')
+        self.assertEqual(task_row.payload, {'counts': {str(post.pk): 2}})
+        self.assertIsNone(counters._timer)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+})
+class PostPageTests(TestCase):
+    """
+    The cached post page, its related posts and the view beacon
+    """
+
+    def setUp(self):
+        caches['pages'].clear()
+        counters.take_pending()  # Start from an empty buffer
+        self.addCleanup(counters.take_pending)
+
+    def test_second_visit_is_served_from_cache(self):
+        post = BlogPost.objects.create(title='Post', content='Text', is_published=True)
+        url = reverse('post_detail', args=[post.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, 'Post')
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_drafts_are_not_shown(self):
+        post = BlogPost.objects.create(title='Draft', content='Text')
+        self.assertEqual(self.client.get(reverse('post_detail', args=[post.pk])).status_code, 404)
+
+    def test_beacon_counts_view_without_queries(self):
+        post = BlogPost.objects.create(title='Post', content='Text', is_published=True)
+        url = reverse('post_view_beacon', args=[post.pk])
+        with self.assertNumQueries(0):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(counters.take_pending(), {post.pk: 1})
+
+    def test_related_posts_in_one_query(self):
+        post = BlogPost.objects.create(title='Post', content='Text', is_published=True)
+        for rank in range(1, 4):
+            other = BlogPost.objects.create(title=f'Other {rank}', content='Long text', is_published=True)
+            RelatedPost.objects.create(post=post, related=other, score=1 / rank, rank=rank)
+
+        # Post, related posts, comments
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('post_detail', args=[post.pk]))
+        self.assertEqual(
+            [other.title for other in response.context['related']],
+            ['Other 1', 'Other 2', 'Other 3'],
+        )
+
+
+class RecommendationTests(TestCase):
+    """
+    TF-IDF related posts
+    """
+
+    documents = [
+        'django caching middleware performance',
+        'django caching performance tuning',
+        'django orm queries performance',
+        'baking sourdough bread at home',
+        'sourdough bread starter recipe',
+    ]
+
+    def test_neighbours(self):
+        matrix = recommendations.tfidf_matrix(self.documents)
+        self.assertEqual(matrix.shape[0], len(self.documents))
+
+        for row, neighbours in recommendations.top_k_neighbours(matrix, top_k=3):
+            ids = [neighbour for neighbour, _ in neighbours]
+            scores = [score for _, score in neighbours]
+            self.assertNotIn(row, ids)  # Never its own neighbour
+            self.assertEqual(scores, sorted(scores, reverse=True))  # Best first
+        best = dict(recommendations.top_k_neighbours(matrix, top_k=1))
+        self.assertEqual(best[0][0][0], 1)
+        self.assertEqual(best[3][0][0], 4)
+
+    def test_batches_give_the_same_result(self):
+        matrix = recommendations.tfidf_matrix(self.documents)
+        whole = list(recommendations.top_k_neighbours(matrix, top_k=2, batch_size=256))
+        for batch_size in (1, 2, 3):
+            self.assertEqual(list(recommendations.top_k_neighbours(matrix, top_k=2, batch_size=batch_size)), whole)
+
+    def test_unrelated_posts_are_not_stored(self):
+        posts = [
+            BlogPost.objects.create(title='', content=text, is_published=True)
+            for text in ('django caching', 'django caching tips', 'sourdough bread')
+        ]
+        self.assertEqual(recommendations.build_related_posts(top_k=2), 2)
+
+        # The two Django posts point at each other, the bread post at nothing
+        links = RelatedPost.objects.order_by('post_id').values_list('post_id', 'related_id', 'rank')
+        self.assertEqual(list(links), [(posts[0].pk, posts[1].pk, 1), (posts[1].pk, posts[0].pk, 1)])
+
+
+class ArchiveTests(TestCase):
+    """
+    Moving posts into the archive tables and back
+    """
+
+    def test_archive_and_restore_round_trip(self):
+        created = timezone.now() - datetime.timedelta(days=800)
+        old = BlogPost.objects.create(title='Old', content='Old text', view_count=7)
+        new = BlogPost.objects.create(title='New', content='New text')
+        BlogPost.objects.filter(pk=old.pk).update(created_at=created, updated_at=created)
+        Comment.objects.create(post=old, name='A', email='a@example.com', text='First', is_approved=True)
+        Comment.objects.create(post=new, name='B', email='b@example.com', text='Stays')
+        RelatedPost.objects.create(post=new, related=old, score=0.5, rank=1)
+
+        # Archive everything older than a year
+        self.assertEqual(archive.archive_old_posts(months=12, batch_size=1), (1, 1))
+        self.assertFalse(BlogPost.objects.filter(pk=old.pk).exists())
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertFalse(RelatedPost.objects.exists())
+        self.assertEqual(ArchivedComment.objects.get().post_id, old.pk)
+
+        # Lookups fall through to the archive
+        self.assertIsInstance(archive.get_post_or_404(old.pk), ArchivedBlogPost)
+
+        # Restore keeps the id, the counters and the original dates
+        archive.restore_post(old.pk)
+        restored = BlogPost.objects.get(pk=old.pk)
+        self.assertEqual(restored.created_at, created)
+        self.assertEqual(restored.view_count, 7)
+        self.assertEqual(restored.comments.get().text, 'First')
+        self.assertFalse(ArchivedBlogPost.objects.exists())
+        self.assertFalse(ArchivedComment.objects.exists())
+
+    def test_comments_are_copied_in_batches(self):
+        created = timezone.now() - datetime.timedelta(days=800)
+        post = BlogPost.objects.create(title='Old', content='Old text')
+        BlogPost.objects.filter(pk=post.pk).update(created_at=created)
+        ids = [
+            Comment.objects.create(post=post, name='A', email='a@example.com', text=f'Comment {i}').pk
+            for i in range(5)
+        ]
+
+        # One INSERT per two comments, every comment arrives
+        with mock.patch.object(ArchivedComment.objects, 'bulk_create', wraps=ArchivedComment.objects.bulk_create) as insert:
+            self.assertEqual(archive.archive_old_posts(months=12, batch_size=2), (1, 5))
+        self.assertEqual([len(call.args[0]) for call in insert.call_args_list], [2, 2, 1])
+        self.assertEqual(sorted(ArchivedComment.objects.values_list('pk', flat=True)), ids)
+
+
+class FeedTests(TestCase):
+    """
+    Sitemap shards and feeds, built incrementally into FEEDS_ROOT
+    """
+
+    def setUp(self):
+        # A throwaway FEEDS_ROOT and two posts per shard
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        settings_override = override_settings(FEEDS_ROOT=root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        patcher = mock.patch.object(feeds, 'SITEMAP_SHARD_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = root
+        self.posts = [
+            BlogPost.objects.create(title=f'Post {i}', content='Text', is_published=True)
+            for i in range(5)
+        ]
+
+    def read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def shards(self):
+        return [feeds.shard_name(shard) for shard in sorted({post.pk // 2 for post in self.posts})]
+
+    def test_only_changed_shards_are_rewritten(self):
+        written = feeds.build_all()
+        self.assertEqual(written, self.shards() + ['sitemap.xml', 'rss.xml', 'atom.xml'])
+        self.assertEqual(feeds.build_all(), [])
+
+        # A newer updated_at rewrites that post's shard, the index and the feeds
+        changed = self.posts[0]
+        changed.save()
+        self.assertEqual(
+            feeds.build_all(),
+            [feeds.shard_name(changed.pk // 2), 'sitemap.xml', 'rss.xml', 'atom.xml'],
+        )
+
+        # A new post in a new shard is a count change
+        new = BlogPost.objects.create(title='New', content='Text', is_published=True, pk=self.posts[-1].pk + 2)
+        self.assertIn(feeds.shard_name(new.pk // 2), feeds.build_all())
+        self.assertIn(reverse('sitemap_shard', args=[new.pk // 2]).encode(), self.read('sitemap.xml'))
+
+    def test_empty_shards_are_removed(self):
+        feeds.build_all()
+        last = self.posts[-1]
+        BlogPost.objects.filter(pk__gte=last.pk // 2 * 2).update(is_published=False)
+        feeds.build_all()
+
+        name = feeds.shard_name(last.pk // 2)
+        self.assertFalse(os.path.exists(os.path.join(self.root, name)))
+        self.assertNotIn(name.encode(), self.read('sitemap.xml'))
+
+    def test_if_missing_only_builds_once(self):
+        self.assertTrue(feeds.build_all(if_missing=True))
+        self.assertEqual(feeds.build_all(if_missing=True), [])
+
+    def test_views_build_on_first_request(self):
+        response = self.client.get(reverse('sitemap_index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'<sitemapindex', b''.join(response.streaming_content))
+
+        shard = self.posts[0].pk // 2
+        response = self.client.get(reverse('sitemap_shard', args=[shard]))
+        self.assertIn(self.posts[0].get_absolute_url().encode(), b''.join(response.streaming_content))
+        self.assertEqual(self.client.get(reverse('sitemap_shard', args=[shard + 100])).status_code, 404)
+
+        response = self.client.get(reverse('rss_feed'))
+        self.assertEqual(response['Content-Type'], 'application/rss+xml; charset=utf-8')
+        self.assertIn(reverse('rss_feed').encode(), b''.join(response.streaming_content))
+
+    def test_lock(self):
+        with feeds.build_lock():
+            with self.assertRaises(TimeoutError):
+                with feeds.build_lock(timeout=0.2):
+                    pass
+
+        # A lock left by a crashed build is taken over
+        path = os.path.join(self.root, feeds.LOCK_NAME)
+        open(path, 'w').close()
+        os.utime(path, (0, 0))
+        with feeds.build_lock(timeout=0):
+            pass
+        self.assertFalse(os.path.exists(path))
+
+    def test_busy_build_returns_503(self):
+        # Another process holds the lock for longer than the view waits
+        open(os.path.join(self.root, feeds.LOCK_NAME), 'w').close()
+        with mock.patch.object(feeds, 'build_lock', functools.partial(feeds.build_lock, timeout=0.2)):
+            response = self.client.get(reverse('sitemap_index'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class SpamTests(TestCase):
+    """
+    Comment spam pre-filter, through the comment endpoint
+    """
+
+    def setUp(self):
+        # Fresh duplicate history for every test
+        spam._duplicates = None
+        self.addCleanup(setattr, spam, '_duplicates', None)
+        self.post = BlogPost.objects.create(title='Post', content='Text', is_published=True)
+        self.url = reverse('add_comment', args=[self.post.pk])
+
+    def comment(self, email, text):
+        return self.client.post(self.url, {'name': 'Someone', 'email': email, 'text': text})
+
+    def test_short_comments_are_not_duplicates(self):
+        self.assertEqual(self.comment('a@x.com', 'Great post, thanks!').status_code, 201)
+        self.assertEqual(self.comment('b@y.com', 'Great post, thanks!').status_code, 201)
+
+    def test_duplicate_rejected(self):
+        text = 'Buy cheap watches today at our amazing online store'
+        self.assertEqual(self.comment('a@x.com', text).status_code, 201)
+        response = self.comment('b@y.com', text + '!')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Duplicate comment', response.content.decode())
+
+    def test_duplicate_from_another_worker_rejected(self):
+        text = 'Buy cheap watches today at our amazing online store'
+        self.assertEqual(self.comment('a@x.com', 'Nice').status_code, 201)
+
+        # Saved by another process, this one only sees it after a refresh
+        Comment.objects.create(post=self.post, name='Bot', email='bot@x.com', text=text)
+        with override_settings(SPAM_DUPLICATE_REFRESH=0):
+            self.assertEqual(self.comment('c@z.com', text).status_code, 400)
+
+    def test_accepted_comment_remembered_once(self):
+        text = 'Buy cheap watches today at our amazing online store'
+        self.assertEqual(self.comment('a@x.com', text).status_code, 201)
+        detector = spam.get_duplicate_detector()
+        self.assertEqual(len(detector.sketches), 1)
+
+        # The next refresh reads the same row, and skips it
+        detector.refresh()
+        self.assertEqual(len(detector.sketches), 1)
+
+    def test_history_seeded_from_database(self):
+        text = 'Buy cheap watches today at our amazing online store'
+        Comment.objects.create(post=self.post, name='Bot', email='bot@x.com', text=text)
+        self.assertEqual(self.comment('c@z.com', text).status_code, 400)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sessions'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+})
+class SessionScopeTests(TestCase):
+    """
+    PathScopedSessionMiddleware: sessions in the admin only
+    """
+
+    def setUp(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'secret')
+
+    def test_admin_login_works(self):
+        response = self.client.post(
+            reverse('admin:login'), {'username': 'admin', 'password': 'secret', 'next': reverse('admin:index')},
+        )
+        self.assertRedirects(response, reverse('admin:index'))
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
+
+    def test_public_page_ignores_session_cookie(self):
+        self.client.login(username='admin', password='secret')
+        self.assertIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+
+        # The cookie is sent, but neither the session nor the user is loaded
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+            self.assertTrue(response.wsgi_request.user.is_anonymous)
+        self.assertNotIn('Cookie', response.get('Vary', ''))
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
+
+
+class CompressionTests(SimpleTestCase):
+    """
+    Which responses CompressionMiddleware compresses, and how
+    """
+
+    body = b'<p>Hello, compressible world</p>' * 100
+
+    def respond(self, response):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_html_and_xml_are_compressed(self):
+        for content_type in ('text/html; charset=utf-8', 'application/json', 'application/rss+xml'):
+            response = self.respond(HttpResponse(self.body, content_type=content_type))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_binary_types_are_left_alone(self):
+        response = self.respond(HttpResponse(self.body, content_type='image/png'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_no_transform_is_honoured(self):
+        response = HttpResponse(self.body)
+        response['Cache-Control'] = 'public, no-transform'
+        self.assertFalse(self.respond(response).has_header('Content-Encoding'))
+
+    def test_pages_with_secrets_are_left_alone(self):
+        # BREACH: the admin, and any page that used the CSRF token
+        admin = CompressionMiddleware(lambda request: HttpResponse(self.body))
+        response = admin(RequestFactory().get('/admin/?q=guess', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        def form_view(request):
+            return HttpResponse(self.body + get_token(request).encode())
+        form = CompressionMiddleware(CsrfViewMiddleware(form_view))
+        response = form(RequestFactory().get('/contact/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_bodies(self):
+        chunks = [self.body[:1000], self.body[1000:]]
+        generated = self.respond(StreamingHttpResponse(iter(chunks), content_type='text/plain'))
+        as_file = self.respond(FileResponse(io.BytesIO(self.body), content_type='application/xml'))
+        for response in (generated, as_file):
+            self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    def test_cache_is_per_url(self):
+        # Two pages that happen to send the same ETag
+        def view(request):
+            response = HttpResponse(request.path.encode() * 100)
+            response['ETag'] = '"v1"'
+            response['Cache-Control'] = 'public, max-age=60'
+            return response
+
+        middleware = CompressionMiddleware(view)
+        for path in ('/a/', '/b/', '/a/'):
+            response = middleware(RequestFactory().get(path, HTTP_ACCEPT_ENCODING='gzip'))
+            self.assertEqual(gzip.decompress(response.content), path.encode() * 100)
+
+
+class LoadTestTests(SimpleTestCase):
+    """
+    Traffic mix, percentiles and the load tester's HTTP client
+    """
+
+    def test_parse_mix(self):
+        mix = loadtest.parse_mix('home=50, admin=0')
+        self.assertEqual(mix['home'], ('/', 50.0))
+        self.assertNotIn('admin', mix)
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix('nope=1')
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix(','.join(f'{name}=0' for name in loadtest.DEFAULT_MIX))
+
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump({'feed': {'path': '/feeds/rss.xml'}}, f)
+            f.flush()
+            self.assertEqual(loadtest.parse_mix('feed=3', f.name), {'feed': ('/feeds/rss.xml', 3.0)})
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile(values, 100), 100)
+        self.assertEqual(loadtest.percentile([7], 99), 7)
+        self.assertEqual(loadtest.percentile([], 50), 0.0)
+
+    def fetch_twice(self, response, close):
+        """
+        Two GETs on one keep-alive connection to a server that always sends `response`
+        Returns both results and whether the client kept the connection
+        """
+        async def handle(reader, writer):
+            try:
+                while True:
+                    await reader.readuntil(b'\r\n\r\n')
+                    writer.write(response)
+                    await writer.drain()
+                    if close:
+                        break
+            except asyncio.IncompleteReadError:
+                pass
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            connection = loadtest.HTTPConnection('127.0.0.1', port, '', keep_alive=True)
+            try:
+                first = await connection.get('/')
+                kept = connection.writer is not None
+                second = await connection.get('/')
+            finally:
+                await connection.close()
+                server.close()
+                await server.wait_closed()
+            return first, second, kept
+
+        return asyncio.run(run())
+
+    def test_content_length_body(self):
+        first, second, kept = self.fetch_twice(b'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello', close=False)
+        self.assertEqual((first, second, kept), ((200, 5), (200, 5), True))
+
+    def test_chunked_body(self):
+        response = (
+            b'HTTP/1.1 404 Not Found\r\nTransfer-Encoding: chunked\r\n\r\n'
+            b'5\r\nhello\r\n6;name=value\r\n world\r\n0\r\n\r\n'
+        )
+        first, second, kept = self.fetch_twice(response, close=False)
+        self.assertEqual((first, second, kept), ((404, 11), (404, 11), True))
+
+    def test_body_until_close(self):
+        first, second, kept = self.fetch_twice(b'HTTP/1.1 200 OK\r\n\r\nhello', close=True)
+        self.assertEqual((first, second, kept), ((200, 5), (200, 5), False))
+
+    def test_http_10_closes_unless_keep_alive(self):
+        # Like python -m http.server: a length, but no keep-alive
+        response = b'HTTP/1.0 200 OK\r\nContent-Length: 2\r\n\r\nhi'
+        first, second, kept = self.fetch_twice(response, close=True)
+        self.assertEqual((first, second, kept), ((200, 2), (200, 2), False))
+
+        response = b'HTTP/1.0 200 OK\r\nConnection: keep-alive\r\nContent-Length: 2\r\n\r\nhi'
+        self.assertTrue(self.fetch_twice(response, close=False)[2])
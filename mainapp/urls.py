@@ -39,6 +39,26 @@ urlpatterns = [
     # Not HTML like the others
     # But same pattern applies
     path('api/data/', views.api_data, name='api_data'),
+
+    # Blog post page
+    # <int:pk> captures the post id from the URL
+    path('posts/<int:pk>/', views.post_detail, name='post_detail'),
+
+    # View counting beacon for the post page
+    path('posts/<int:pk>/view/', views.post_view_beacon, name='post_view_beacon'),
+
+    # New comments, checked by the spam pre-filter
+    path('posts/<int:pk>/comments/', views.add_comment, name='add_comment'),
+
+    # Sitemaps
+    # sitemap.xml is the index, the shards hold the post URLs
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:shard>.xml', views.sitemap_shard, name='sitemap_shard'),
+
+    # Feeds
+    # RSS and Atom versions of the same posts
+    path('feeds/rss.xml', views.rss_feed, name='rss_feed'),
+    path('feeds/atom.xml', views.atom_feed, name='atom_feed'),
 ]
 
 # End of URL configuration
@@ -6,7 +6,16 @@
 # Importing necessary modules
 from django.shortcuts import render  # NECESSARY: render function to render templates
 from django.http import HttpResponse  # For returning HTTP responses
+from django.http import FileResponse, Http404  # For sending generated files
+from django.conf import settings  # For FEEDS_ROOT and cache settings
+from django.views.decorators.cache import cache_control, cache_page, never_cache  # For cacheable pages
+from django.views.decorators.csrf import csrf_exempt  # For the view beacon
+from django.views.decorators.http import require_POST  # For the view beacon
 import datetime  # For getting current date and time
+import os  # For file paths
+
+# Our models
+from .models import BlogPost, RelatedPost
 
 # This is a comment
 # Another comment
@@ -113,6 +122,162 @@ def api_data(request):
     return JsonResponse(data)
 
 
+# Blog post page
+# NECESSARY: Cached as a whole, so repeat visits never reach the database
+# public lets CDNs and proxies cache it too
+# Views are counted by post_view_beacon instead, see below
+@cache_page(settings.POST_CACHE_SECONDS, cache='pages')  # Own cache alias, see CACHES
+@cache_control(public=True)
+def post_detail(request, pk):
+    """
+    Show one blog post with its approved comments
+    Falls through to the archive for old posts
+    """
+    # Imported here like the other helpers
+    from .archive import get_post_or_404
+
+    # Live post or archived post
+    post = get_post_or_404(pk)
+
+    # Drafts are not public
+    if not post.is_published:
+        raise Http404("No post with that id")
+
+    # Related posts
+    # NECESSARY: Precomputed by build_related_posts, one query with a join
+    # order_by('rank') replaces Meta.ordering, which would join BlogPost a second time
+    # only() skips the related posts' content, the template needs id and title
+    related = [
+        link.related
+        for link in RelatedPost.objects
+        .filter(post_id=post.pk, related__is_published=True)
+        .select_related('related')
+        .order_by('rank')
+        .only('related__id', 'related__title')
+    ]
+
+    # Context for the template
+    context = {
+        'title': post.title,  # Page title
+        'post': post,  # The post
+        'comments': list(post.comments.filter(is_approved=True)),  # Approved comments only
+        'related': related,  # Related posts
+        'year': datetime.datetime.now().year,  # Current year
+    }
+    return render(request, 'post_detail.html', context)
+
+
+# View counting beacon
+# The post page sends a POST here with navigator.sendBeacon
+# It counts the view in memory and returns straight away
+@csrf_exempt  # Beacons can't send a CSRF token, and there's nothing to protect
+@require_POST
+@never_cache
+def post_view_beacon(request, pk):
+    """
+    Count one view of a post
+    Returns 204 No Content
+    """
+    from .counters import record_view
+    record_view(pk)
+    return HttpResponse(status=204)
+
+
+# Add a comment to a post
+# Called with fetch() from the comment form on the post page
+# No CSRF token: the post page is cached and public pages have no session to protect
+@csrf_exempt
+@require_POST
+def add_comment(request, pk):
+    """
+    Save a new comment for moderation
+    Returns JSON with the result
+    """
+    from django.http import JsonResponse
+    from .forms import CommentForm
+
+    # Validate and spam-check first
+    # NECESSARY: Spam is turned away before any write
+    # The duplicate check only reads new comments every SPAM_DUPLICATE_REFRESH seconds
+    form = CommentForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'status': 'rejected', 'errors': form.errors}, status=400)
+
+    # Only live, published posts take comments
+    try:
+        post = BlogPost.objects.only('pk').get(pk=pk, is_published=True)
+    except BlogPost.DoesNotExist:
+        raise Http404("No post with that id")
+
+    # Save it, waiting for approval
+    form.instance.post = post
+    form.save()
+    return JsonResponse({'status': 'pending'}, status=201)
+
+
+# Sitemap and feed views
+# These never query the database
+# They send the files written by `python manage.py build_feeds`
+def _serve_feed_file(name, content_type):
+    """
+    Send a generated file from FEEDS_ROOT
+    Builds the files first if they were never built
+    """
+    # Imported here so the feed builder only loads when needed
+    from .feeds import MANIFEST_NAME, build_all
+
+    # Path of the file on disk
+    path = os.path.join(settings.FEEDS_ROOT, name)
+
+    # First request after a fresh deploy
+    # NECESSARY: Build once instead of returning 404
+    # Only when nothing was ever built, so unknown shards can't trigger builds
+    # Concurrent first requests wait for one build instead of each running one
+    if not os.path.exists(os.path.join(settings.FEEDS_ROOT, MANIFEST_NAME)):
+        try:
+            build_all(if_missing=True)
+        except TimeoutError:
+            response = HttpResponse("Feeds are being built, try again shortly", status=503)
+            response['Retry-After'] = '30'
+            return response
+    if not os.path.exists(path):
+        raise Http404("No such file")
+
+    # FileResponse streams the file without reading it all into memory
+    response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def sitemap_index(request):
+    """
+    sitemap.xml, the index of all sitemap shards
+    """
+    return _serve_feed_file('sitemap.xml', 'application/xml')
+
+
+def sitemap_shard(request, shard):
+    """
+    One sitemap shard with up to 50,000 post URLs
+    """
+    from .feeds import shard_name
+    return _serve_feed_file(shard_name(shard), 'application/xml')
+
+
+def rss_feed(request):
+    """
+    RSS feed of the latest published posts
+    """
+    return _serve_feed_file('rss.xml', 'application/rss+xml; charset=utf-8')
+
+
+def atom_feed(request):
+    """
+    Atom feed of the latest published posts
+    """
+    return _serve_feed_file('atom.xml', 'application/atom+xml; charset=utf-8')
+
+
 # End of views.py
 # That's all folks!
 # Hope you enjoyed all these comments
@@ -0,0 +1,97 @@
+# Cache warming
+# Requests every public page once after a deploy, so the first real visitors
+# get pages from the shared page cache and feed files that are already built
+# NECESSARY: This runs in its own process, so only shared caches stay warm
+# Templates and other per-process caches of the web workers are not touched
+# Used by `python manage.py warm_cache` and the warm_cache task
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+from .models import BlogPost
+from .urls import urlpatterns
+
+
+def public_urls(posts=100):
+    """
+    Every GET page in mainapp/urls.py, plus the newest `posts` post pages
+    and the extra URLs in WARM_CACHE_URLS
+    """
+    urls = []
+    for pattern in urlpatterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        # Routes without parameters can be reversed as they are
+        # Routes with parameters (post pages, beacons, comments) are handled below
+        if not pattern.pattern.converters:
+            urls.append(reverse(pattern.name))
+
+    # The most recent posts are the most likely to be visited
+    if posts:
+        ids = (
+            BlogPost.objects
+            .filter(is_published=True)
+            .order_by('-created_at')
+            .values_list('pk', flat=True)[:posts]
+        )
+        urls.extend(reverse('post_detail', args=[pk]) for pk in ids)
+
+    # Anything else, e.g. category pages
+    urls.extend(settings.WARM_CACHE_URLS)
+    return urls
+
+
+def cache_hosts():
+    """
+    The hosts visitors use, from WARM_CACHE_HOSTS or else SITE_URL
+    """
+    return list(settings.WARM_CACHE_HOSTS) or [settings.SITE_URL]
+
+
+def warm(urls, concurrency=8, host=None):
+    """
+    Request every URL once, `concurrency` at a time
+    `host` is a host name or an origin like https://www.example.com,
+    the SITE_URL host by default
+    Returns a list of (url, status code, seconds), slowest first
+    """
+    # NECESSARY: cache_page keys include the scheme and host of the request,
+    # so pages must be requested exactly the way visitors request them
+    # The host must also pass ALLOWED_HOSTS
+    origin = host or settings.SITE_URL
+    if '://' not in origin:
+        origin = 'http://' + origin
+    origin = urlsplit(origin)
+    host = origin.netloc or 'localhost'
+    secure = origin.scheme == 'https'
+
+    # The test client isn't thread-safe, so every thread gets its own
+    local = threading.local()
+
+    def fetch(url):
+        client = getattr(local, 'client', None)
+        if client is None:
+            # Errors come back as 500 responses instead of exceptions
+            client = local.client = Client(raise_request_exception=False, HTTP_HOST=host)
+        started = time.perf_counter()
+        # Requests go straight to Django, no server needed
+        status = client.get(url, secure=secure).status_code
+        return url, status, time.perf_counter() - started
+
+    def fetch_and_close(url):
+        try:
+            return fetch(url)
+        finally:
+            # Each thread opened its own connection
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='warm') as pool:
+        results = list(pool.map(fetch_and_close, urls))
+    return sorted(results, key=lambda result: result[2], reverse=True)
@@ -42,7 +42,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'mainapp.middleware.CompressionMiddleware',  # Brotli/gzip, must run after ConditionalGet on the response
+    'django.middleware.http.ConditionalGetMiddleware',  # ETags and 304 responses
+    'mainapp.session_middleware.PathScopedSessionMiddleware',  # Sessions only under SESSION_PATH_PREFIXES
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -50,6 +52,16 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Sessions
+# https://docs.djangoproject.com/en/6.0/topics/http/sessions/
+
+# NECESSARY: Only these paths load and save sessions
+# Everywhere else request.user is AnonymousUser and the session table is never read
+SESSION_PATH_PREFIXES = ['/admin/']
+
+# Sessions are read from the cache and only fall back to the database on a miss
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
@@ -81,6 +93,99 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# NECESSARY: File based so every worker process shares the same cached pages
+
+# NECESSARY: Post pages get their own alias and directory, so they can't evict sessions
+# (cached_db) and the other way round
+# FileBasedCache culls when a set finds MAX_ENTRIES files, the default is only 300
+# cache_page stores two entries per page (headers and body) for every host
+# Culling lists the whole directory, so CULL_FREQUENCY 10 drops a tenth at a time
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'pages',
+        'OPTIONS': {
+            # Room for 2 entries x 10,000 posts x 2 hosts
+            'MAX_ENTRIES': 40000,
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# How long a post page is cached, in seconds
+# Also sent to browsers and CDNs as max-age
+POST_CACHE_SECONDS = 300
+
+# Post views are buffered in memory and written in batches
+# Whichever comes first: this many views, or this many seconds after the first one
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+
+# Extra pages for `python manage.py warm_cache`, e.g. category pages
+WARM_CACHE_URLS = []
+
+# Hosts or origins visitors use, e.g. ['https://www.example.com']
+# NECESSARY: Cached pages are keyed by scheme and host, empty means SITE_URL
+WARM_CACHE_HOSTS = []
+
+
+# Background tasks
+# See mainapp/taskqueue.py and `python manage.py run_worker`
+
+# Run tasks inside enqueue() instead of in the worker, handy in development
+TASKS_EAGER = False
+
+# Retry delays: 5s, 10s, 20s ... capped at one hour
+TASKS_RETRY_BASE_SECONDS = 5
+TASKS_RETRY_MAX_SECONDS = 3600
+
+
+# Response compression
+# See mainapp.middleware.CompressionMiddleware
+
+# Bodies smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = 200
+
+# gzip level 1-9 and Brotli quality 0-11
+# Mid values compress well without costing much CPU per request
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Compressed bodies kept per worker, keyed by ETag
+COMPRESSION_CACHE_SIZE = 128
+
+
+# Comment spam pre-filter
+# See mainapp/spam.py
+
+# Known spam emails, domains and link hosts, one per line
+SPAM_BLOCKLIST_PATH = BASE_DIR / 'spam_blocklist.txt'
+
+# Comments with more links than this are rejected
+SPAM_MAX_LINKS = 3
+
+# Comments this similar (0-1) to a recent one are rejected
+SPAM_DUPLICATE_THRESHOLD = 0.8
+
+# How many recent comments are remembered per worker
+SPAM_DUPLICATE_HISTORY = 1000
+
+# Seconds between reading comments saved by other workers
+SPAM_DUPLICATE_REFRESH = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -122,6 +227,20 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+
+# Sitemaps and feeds
+# Built by `python manage.py build_feeds` and served straight from disk
+
+# NECESSARY: Sitemaps and feeds need absolute URLs
+SITE_URL = 'http://localhost:8000'
+
+# Where the generated sitemap.xml, rss.xml and atom.xml are written
+FEEDS_ROOT = BASE_DIR / 'feeds'
+
+# Feed metadata
+FEED_TITLE = 'MyDjangoSite'
+FEED_DESCRIPTION = 'Latest blog posts from MyDjangoSite'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,55 @@
+"""
+Django settings for public-only workers.
+
+Use this settings module for workers that only serve the pages in
+mainapp/urls.py. It skips django.contrib.admin and the apps that only the
+admin needs, so workers import less code, start faster and use less memory.
+Admin workers keep using myproject.settings.
+
+    DJANGO_SETTINGS_MODULE=myproject.settings_public gunicorn myproject.wsgi_public
+
+Compare the two with `python manage.py importtime myproject.settings myproject.settings_public`.
+"""
+
+# Start from the full settings
+# NECESSARY: Database, templates, static files etc. stay the same
+from .settings import *  # noqa: F401,F403
+
+
+# Application definition
+# Only our app, no admin, auth, sessions or messages
+# staticfiles stays so /static/ keeps working with runserver and DEBUG
+INSTALLED_APPS = [
+    'django.contrib.staticfiles',  # Serves /static/ in development
+    'mainapp',  # Our main application
+]
+
+# Middleware without sessions, auth and messages
+# The public pages don't use any of them
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'mainapp.middleware.CompressionMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+# URLs without the admin site
+ROOT_URLCONF = 'myproject.urls_public'
+
+# Templates without the auth and messages context processors
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'myproject.wsgi_public.application'
@@ -0,0 +1,13 @@
+"""
+URL configuration for public-only workers.
+
+Same as myproject/urls.py without the admin site, so django.contrib.admin is
+never imported. Used by myproject.settings_public.
+"""
+from django.urls import path, include
+
+# URL patterns for public workers
+# Only the main app, no admin
+urlpatterns = [
+    path('', include('mainapp.urls')),
+]
@@ -0,0 +1,14 @@
+"""
+WSGI config for public-only workers.
+
+Same as myproject/wsgi.py but defaults to myproject.settings_public, which
+leaves out the admin. Run admin workers with myproject.wsgi.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings_public')
+
+application = get_wsgi_application()